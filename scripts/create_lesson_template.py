@@ -2,69 +2,50 @@ import os
 import sys
 import json
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES_JSON_PATH = os.path.join(PROJECT_ROOT, 'src', 'data', 'lesson-modules.json')
+LESSON_INDEX_PATH = os.path.join(PROJECT_ROOT, 'src', 'lessons', 'index.ts')
+
 def to_pascal_case(s):
     return ''.join(word.capitalize() for word in s.replace('-', ' ').replace('_', ' ').split())
 
-def create_lesson_template(lesson_id, module_id):
+def generate_lesson_traces(lesson_ids):
     """
-    Creates the lesson folder, markdown file, and hook file for a lesson.
-    Returns a dict with the generated paths:
-    {
-        'lesson_folder': <folder>,
-        'md_path': <markdown file>,
-        'hook_path': <hook file>
-    }
-    Raises exceptions on error.
+    Generates and validates the traces of the given lessons in this process, leaving all other traces alone.
+    Returns the result of build_traces in src/tracer/trace_build.py, or None if a lesson has no entry in
+    lesson-problems.json yet.
     """
-    # Get project root (parent of 'scripts' directory)
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-    # 1. Update module's lesson list in lesson-modules.json
-    modules_json_path = os.path.join(project_root, 'src', 'data', 'lesson-modules.json')
-    if not os.path.exists(modules_json_path):
-        raise FileNotFoundError(f"Modules file not found: {modules_json_path}")
-
-    with open(modules_json_path, 'r', encoding='utf-8') as f:
-        modules_data = json.load(f)
-
-    module_found = False
-    for module in modules_data:
-        if module.get('id') == module_id:
-            module_found = True
-            if 'lessonIds' not in module:
-                module['lessonIds'] = []
-            if lesson_id not in module['lessonIds']:
-                module['lessonIds'].append(lesson_id)
-                print(f"Added {lesson_id} to module {module_id}")
-            else:
-                print(f"{lesson_id} already in module {module_id}")
+    tracer_dir = os.path.join(PROJECT_ROOT, 'src', 'tracer')
+    if tracer_dir not in sys.path:
+        sys.path.insert(0, tracer_dir)
+    from trace_build import build_traces
 
-    if not module_found:
-        raise ValueError(f"Module id '{module_id}' not found in {modules_json_path}")
-
-    with open(modules_json_path, 'w', encoding='utf-8') as f:
-        json.dump(modules_data, f, indent=2)
-
-    # 2. Create lesson folder
-    lesson_folder = os.path.join(project_root, 'src', 'lessons', 'hooks', lesson_id)
-    os.makedirs(lesson_folder, exist_ok=True)
-
-    # 3. Create markdown file
-    md_path = os.path.join(lesson_folder, f"{lesson_id}.md")
-    if not os.path.exists(md_path):
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(f"# {to_pascal_case(lesson_id)}\n\nLesson content here.\n")
-        print(f"Created {md_path}")
-    else:
-        print(f"{md_path} already exists")
-
-    # 4. Create hook file
-    hook_name = f"use{to_pascal_case(lesson_id)}"
-    hook_path = os.path.join(lesson_folder, f"{hook_name}.ts")
-    if not os.path.exists(hook_path):
-        with open(hook_path, 'w', encoding='utf-8') as f:
-            f.write(
-f"""import {{ useLessonStore }} from '@/store/lessonStore';
+    print(f"Generating traces for {', '.join(lesson_ids)}")
+    try:
+        return build_traces(lesson_ids)
+    except ValueError as e:
+        print(f"Skipping trace generation: {e}")
+        return None
+
+class DiskFiles:
+    """Reads and writes files on disk right away, with the read/write interface of FileTransaction in generate_lesson.py"""
+
+    def read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+def lesson_hook_name(lesson_id):
+    return f"use{to_pascal_case(lesson_id)}"
+
+def lesson_hook_source(lesson_id):
+    """Source of a hook that starts the lesson with its markdown and no tasks"""
+    hook_name = lesson_hook_name(lesson_id)
+    return f"""import {{ useLessonStore }} from '@/store/lessonStore';
 import {{ useTraceStore }} from '@/store/traceStore';
 import content from "./{lesson_id}.md";
 import {{ useEffect }} from "react";
@@ -81,35 +62,118 @@ useEffect(() => {{
     ]);
   }}, [lessonId, startLesson, completeTask, currentTask, traceData]);
 }}
-""")
-        print(f"Created {hook_path}")
+"""
+
+def add_lesson_hook(index_source, lesson_id, hook_path):
+    """
+    Adds an import and entry to lessonHooks in the source of src/lessons/index.ts for the new lesson.
+    Returns the updated source.
+    """
+    # Compute the import path relative to index.ts (without .ts extension)
+    import_path = os.path.relpath(hook_path, os.path.dirname(LESSON_INDEX_PATH)).replace('.ts', '').replace('\\', '/')
+    if not import_path.startswith('.'):
+        import_path = './' + import_path
+
+    # Derive hook name from filename
+    hook_name = os.path.splitext(os.path.basename(hook_path))[0]
+
+    lines = index_source.splitlines(keepends=True)
+
+    # Check if already present
+    import_line = f'import {{ {hook_name} }} from "{import_path}";\n'
+    if any(import_line.strip() == line.strip() for line in lines):
+        return index_source  # Already present
+
+    # Insert import after last import
+    last_import_idx = 0
+    for i, line in enumerate(lines):
+        if line.startswith('import '):
+            last_import_idx = i
+    lines.insert(last_import_idx + 1, import_line)
+
+    # Add to lessonHooks
+    for i, line in enumerate(lines):
+        if 'export const lessonHooks:' in line:
+            # Find the next '{'
+            for j in range(i, len(lines)):
+                if '{' in lines[j]:
+                    insert_idx = j + 1
+                    break
+            else:
+                continue
+            # Insert new entry
+            entry_line = f'  "{lesson_id}": {hook_name},\n'
+            # Find where to insert (before closing })
+            for k in range(insert_idx, len(lines)):
+                if '};' in lines[k]:
+                    lines.insert(k, entry_line)
+                    break
+            break
+
+    return ''.join(lines)
+
+def add_lesson_files(files, lesson_id, module_id, markdown=None, hook_source=None):
+    """
+    Adds a lesson to its module in lesson-modules.json, writes its markdown and hook files and
+    registers the hook in src/lessons/index.ts, through the read and write methods of `files`.
+    Without `markdown` or `hook_source`, an existing file is kept and a missing one gets a placeholder.
+    Returns a dict with the lesson paths:
+    {
+        'lesson_id': <lesson id>,
+        'lesson_folder': <folder>,
+        'md_path': <markdown file>,
+        'hook_path': <hook file>
+    }
+    """
+    # 1. Update module's lesson list in lesson-modules.json
+    modules_data = json.loads(files.read(MODULES_JSON_PATH))
+    module = next((module for module in modules_data if module.get('id') == module_id), None)
+    if module is None:
+        raise ValueError(f"Module id '{module_id}' not found in {MODULES_JSON_PATH}")
+    module.setdefault('lessonIds', [])
+    if lesson_id not in module['lessonIds']:
+        module['lessonIds'].append(lesson_id)
+        print(f"Added {lesson_id} to module {module_id}")
     else:
-        print(f"{hook_path} already exists")
+        print(f"{lesson_id} already in module {module_id}")
+    files.write(MODULES_JSON_PATH, json.dumps(modules_data, indent=2))
 
-    # 5. Optionally run trace.py with the new lesson_id
-    trace_py_path = os.path.join(project_root, 'src', 'tracer', 'trace.py')
-    if os.path.exists(trace_py_path):
-        import subprocess
-        print(f"Running trace.py")
-        try:
-            result = subprocess.run([
-                sys.executable, trace_py_path
-            ], capture_output=True, text=True, check=True)
-            print(result.stdout)
-            if result.stderr:
-                print(result.stderr)
-        except subprocess.CalledProcessError as e:
-            print(f"trace.py failed: {e}")
-            print(e.output)
+    # 2. Write the markdown and hook files in the lesson folder
+    lesson_folder = os.path.join(PROJECT_ROOT, 'src', 'lessons', 'hooks', lesson_id)
+    md_path = os.path.join(lesson_folder, f"{lesson_id}.md")
+    hook_path = os.path.join(lesson_folder, f"{lesson_hook_name(lesson_id)}.ts")
+    if markdown is not None or not os.path.exists(md_path):
+        files.write(md_path, markdown if markdown is not None else f"# {to_pascal_case(lesson_id)}\n\nLesson content here.\n")
     else:
-        print(f"trace.py not found at {trace_py_path}, skipping trace generation.")
+        print(f"{md_path} already exists")
+    if hook_source is not None or not os.path.exists(hook_path):
+        files.write(hook_path, hook_source if hook_source is not None else lesson_hook_source(lesson_id))
+    else:
+        print(f"{hook_path} already exists")
+
+    # 3. Register the hook in src/lessons/index.ts
+    files.write(LESSON_INDEX_PATH, add_lesson_hook(files.read(LESSON_INDEX_PATH), lesson_id, hook_path))
 
     return {
+        'lesson_id': lesson_id,
         'lesson_folder': lesson_folder,
         'md_path': md_path,
-        'hook_path': hook_path
+        'hook_path': hook_path,
     }
 
+def create_lesson_template(lesson_id, module_id):
+    """
+    Creates the lesson folder, markdown file, and hook file for a lesson and registers its hook.
+    Returns a dict with the generated paths, see add_lesson_files.
+    Raises exceptions on error.
+    """
+    paths = add_lesson_files(DiskFiles(), lesson_id, module_id)
+
+    # Generate the trace of the new lesson, if it already has an entry in lesson-problems.json
+    generate_lesson_traces([lesson_id])
+
+    return paths
+
 def main():
     if len(sys.argv) != 3:
         print("Usage: python scripts/create_lesson_template.py <lessonId> <moduleId>")
@@ -3,13 +3,25 @@ import sys
 import os
 import re
 import json
+import time
+import hashlib
+import functools
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import jsonschema
 load_dotenv()
-from openai import OpenAI
 
-USE_LLM_CACHE = False
 MODEL = "gpt-4o"
+TEMPERATURE = 0.7
+MAX_TOKENS = 4000
+
+# Responses are cached by model, prompt and function schema so that re-running with an unchanged prompt is free
+LLM_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.llm-cache')
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LESSONS_JSON_PATH = os.path.join(PROJECT_ROOT, 'src', 'data', 'lesson-problems.json')
 
 # Example file paths (update if needed)
 PROMPT_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'lesson_generation_verbaitm_prompt.txt')
@@ -49,16 +61,162 @@ LESSON_JSON_SCHEMA = {
     "additionalProperties": False
 }
 
+# Function schema for OpenAI function calling
+LESSON_FUNCTIONS = [
+    {
+        "name": "generate_lesson",
+        "description": "Generate a lesson in three parts: lesson_json, lesson_markdown, lesson_typescript.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "lesson_json": {
+                    "type": "object",
+                    "description": "Lesson data object. All fields required. No additional properties allowed.",
+                    "properties": {
+                        "id": {"type": "string"},
+                        "title": {"type": "string"},
+                        "description": {"type": "string"},
+                        "template": {"type": "string"},
+                        "solution": {"type": "string"},
+                        "entrypoint": {"type": "string"},
+                        "inputs": {"type": "object"},
+                        "time": {"type": "integer"},
+                        "mode": {"type": "string"}
+                    },
+                    "required": [
+                        "id", "title", "description", "template", "solution",
+                        "entrypoint", "inputs", "time", "mode"
+                    ],
+                    "additionalProperties": False
+                },
+                "lesson_markdown": {"type": "string"},
+                "lesson_typescript": {"type": "string"}
+            },
+            "required": ["lesson_json", "lesson_markdown", "lesson_typescript"]
+        }
+    }
+]
+
 def parse_arguments():
     parser = argparse.ArgumentParser(
-        description='Generate a PythonQuest lesson from external content using GPT-4.'
+        description='Generate PythonQuest lessons from external content using GPT-4.'
     )
-    parser.add_argument('file_path', help='Path to the source lesson text file')
-    parser.add_argument('module_id', help='ID of the module this lesson belongs to')
-    parser.add_argument('--lesson_id', help='Optional custom lesson ID (will auto-increment if exists)')
+    parser.add_argument('file_paths', nargs='+', metavar='file_path', help='Paths to the source lesson text files, one lesson each')
+    parser.add_argument('module_id', help='ID of the module the lessons belong to')
+    parser.add_argument('--lesson_id', help='Optional custom lesson ID for a single source file (will auto-increment if exists)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of LLM calls in flight')
+    parser.add_argument('--offline', nargs='?', const='', metavar='RESPONSE_JSON',
+                        help='Use a local stand-in for the LLM, replaying RESPONSE_JSON if given')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the LLM, without reading or writing the response cache')
     return parser.parse_args()
 
+class ResponseCache:
+    """Content-addressed cache of LLM responses on disk, evicting the least recently used past max_bytes"""
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(model, prompt, functions, **params):
+        """Hash of everything that determines a response"""
+        content = {
+            'model': model,
+            'prompt': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            'functions': functions,
+            'params': params,
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """The cached response for a key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                response = json.load(f)['response']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+        # Reads count as uses for eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted by a concurrent generation after the read, the response is still good
+        return response
+
+    def put(self, key, response, model):
+        """Store a response and evict old entries if the cache grew too large"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'created': time.time(), 'response': response}, f, indent=2)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue  # Evicted by a concurrent generation
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+class OfflineClient:
+    """
+    Stand-in for the OpenAI client for offline runs and tests.
+    Replays the function call arguments from a response file, or answers with a placeholder
+    lesson derived from the prompt that passes LESSON_JSON_SCHEMA.
+    """
+
+    def __init__(self, response_path=None):
+        self.response_path = response_path
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, **kwargs):
+        if self.response_path:
+            with open(self.response_path, 'r', encoding='utf-8') as f:
+                arguments = f.read()
+        else:
+            from create_lesson_template import lesson_hook_source
+            prompt_hash = hashlib.sha256(messages[-1]['content'].encode('utf-8')).hexdigest()[:8]
+            lesson_id = f"offline-lesson-{prompt_hash}"
+            arguments = json.dumps({
+                'lesson_json': {
+                    'id': lesson_id,
+                    'title': 'Offline Lesson',
+                    'description': 'Placeholder lesson generated without an LLM.',
+                    'template': 'x = 1\nprint(x)\n',
+                    'solution': 'x = 1\nprint(x)\n',
+                    'entrypoint': '',
+                    'inputs': {},
+                    'time': 5,
+                    'mode': 'line',
+                },
+                'lesson_markdown': '# Offline Lesson\n\nLesson content here.',
+                # A hook the lesson index can import, so that the tree still builds
+                'lesson_typescript': lesson_hook_source(lesson_id),
+            })
+        message = SimpleNamespace(function_call=SimpleNamespace(name='generate_lesson', arguments=arguments))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
 def initialize_openai_client():
+    # Imported here so that offline runs work without the openai package
+    from openai import OpenAI
     # With openai>=1.0.0, just instantiate OpenAI() and it will use the env var
     try:
         client = OpenAI()
@@ -115,6 +273,8 @@ def load_few_shot_example(lesson_id, i):
     return example_text
 
 
+# The template and examples are read once per run, not once per lesson
+@functools.lru_cache(maxsize=None)
 def load_few_shot_examples():
     examples = ""
     for i, key in enumerate(EXAMPLES):
@@ -122,6 +282,7 @@ def load_few_shot_examples():
         examples += example_output + "\n\n"
     return examples
     
+@functools.lru_cache(maxsize=None)
 def load_prompt_template():
     if not os.path.exists(PROMPT_TEMPLATE_PATH):
         raise FileNotFoundError(f"Prompt template file not found: {PROMPT_TEMPLATE_PATH}")
@@ -141,58 +302,30 @@ def build_llm_prompt(source_text, module_id, lesson_id=None):
         prompt = prompt.replace('{LESSON_ID}', '')
     return prompt
 
-def generate_lesson_content(client, source_text, module_id, lesson_id=None):
+def generate_lesson_content(client, source_text, module_id, lesson_id=None, cache=None):
     prompt = build_llm_prompt(source_text, module_id, lesson_id)
-    # Define the function schema for OpenAI function calling
-    functions = [
-        {
-            "name": "generate_lesson",
-            "description": "Generate a lesson in three parts: lesson_json, lesson_markdown, lesson_typescript.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "lesson_json": {
-                        "type": "object",
-                        "description": "Lesson data object. All fields required. No additional properties allowed.",
-                        "properties": {
-                            "id": {"type": "string"},
-                            "title": {"type": "string"},
-                            "description": {"type": "string"},
-                            "template": {"type": "string"},
-                            "solution": {"type": "string"},
-                            "entrypoint": {"type": "string"},
-                            "inputs": {"type": "object"},
-                            "time": {"type": "integer"},
-                            "mode": {"type": "string"}
-                        },
-                        "required": [
-                            "id", "title", "description", "template", "solution",
-                            "entrypoint", "inputs", "time", "mode"
-                        ],
-                        "additionalProperties": False
-                    },
-                    "lesson_markdown": {"type": "string"},
-                    "lesson_typescript": {"type": "string"}
-                },
-                "required": ["lesson_json", "lesson_markdown", "lesson_typescript"]
-            }
-        }
-    ]
+    if cache is not None:
+        key = ResponseCache.key(MODEL, prompt, LESSON_FUNCTIONS, temperature=TEMPERATURE, max_tokens=MAX_TOKENS)
+        cached = cache.get(key)
+        if cached is not None:
+            print("Using cached LLM response for an identical prompt.")
+            return cached
     try:
         response = client.chat.completions.create(
             model=MODEL,
             messages=[{"role": "user", "content": prompt}],
-            functions=functions,
+            functions=LESSON_FUNCTIONS,
             function_call={"name": "generate_lesson"},
-            temperature=0.7,
-            max_tokens=4000
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS
         )
         # Parse the function_call.arguments JSON for the result
         arguments = response.choices[0].message.function_call.arguments
-        return arguments
     except Exception as e:
-        print(f"Error during OpenAI API call: {e}", file=sys.stderr)
-        sys.exit(1)
+        raise RuntimeError(f"Error during OpenAI API call: {e}") from e
+    if cache is not None:
+        cache.put(key, arguments, MODEL)
+    return arguments
 
 def parse_generated_content(content):
     """
@@ -214,12 +347,7 @@ def parse_generated_content(content):
     except Exception as e:
         raise ValueError(f"Failed to parse structured LLM output: {e}")
 
-def ensure_unique_lesson_id(lesson_id, lessons_file_path):
-    if not os.path.exists(lessons_file_path):
-        raise FileNotFoundError(f"lesson-problems.json not found: {lessons_file_path}")
-    with open(lessons_file_path, 'r', encoding='utf-8') as f:
-        lessons = json.load(f)
-    existing_ids = {lesson["id"] for lesson in lessons}
+def ensure_unique_lesson_id(lesson_id, existing_ids):
     if lesson_id not in existing_ids:
         return lesson_id
     base_id = lesson_id
@@ -228,156 +356,170 @@ def ensure_unique_lesson_id(lesson_id, lessons_file_path):
         counter += 1
     return f"{base_id}-{counter}"
 
-def update_lessons_json(lesson_json_obj, lessons_file_path):
-    if not os.path.exists(lessons_file_path):
-        raise FileNotFoundError(f"lesson-problems.json not found: {lessons_file_path}")
-    with open(lessons_file_path, 'r', encoding='utf-8') as f:
-        lessons = json.load(f)
-    lessons.append(lesson_json_obj)
-    with open(lessons_file_path, 'w', encoding='utf-8') as f:
-        json.dump(lessons, f, indent=2)
+class FileTransaction:
+    """
+    Stages file writes in memory and applies them together.
+    Nothing is written until commit(). If applying any write fails, the files already replaced
+    are restored and the new ones removed, so the tree is never left half updated.
+    """
 
-def create_lesson_files(lesson_id, module_id, markdown_content, typescript_content):
-    try:
-        from create_lesson_template import create_lesson_template
-    except ImportError as e:
-        print(f"Error importing create_lesson_template: {e}", file=sys.stderr)
-        raise
-    # Run the template creation logic and get paths
-    paths = create_lesson_template(lesson_id, module_id)
-    md_path = paths['md_path']
-    hook_path = paths['hook_path']
-    # Overwrite files
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
-    with open(hook_path, 'w', encoding='utf-8') as f:
-        f.write(typescript_content)
-    return paths
+    def __init__(self):
+        self.staged = {}
+
+    def read(self, path):
+        """The staged content of a file, or its content on disk"""
+        path = os.path.abspath(path)
+        if path in self.staged:
+            return self.staged[path]
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def write(self, path, content):
+        self.staged[os.path.abspath(path)] = content
+
+    def commit(self):
+        # Write everything to temporary files first, so the renames below are all that can fail
+        temp_paths = {}
+        try:
+            for path, content in self.staged.items():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_paths[path] = f"{path}.tmp"
+                with open(temp_paths[path], 'w', encoding='utf-8') as f:
+                    f.write(content)
+        except Exception:
+            for temp_path in temp_paths.values():
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+        originals = {}
+        try:
+            for path, temp_path in temp_paths.items():
+                originals[path] = self.read_disk(path)
+                os.replace(temp_path, path)
+        except Exception:
+            for path, original in originals.items():
+                if original is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(original)
+            for temp_path in temp_paths.values():
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+        self.staged = {}
+
+    @staticmethod
+    def read_disk(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
 
 def escape_newlines_in_json(json_str):
     # This is a simple approach and assumes no multiline string values with embedded quotes
     # For robust handling, use a JSON parser that supports non-standard JSON, or fix at the source
     return re.sub(r'(?<!\\)\n', r'\\n', json_str)
 
-def update_lesson_hooks_index(lesson_id, hook_path):
+def stage_lesson(transaction, parsed_content, module_id):
     """
-    Adds an import and entry to lessonHooks in src/lessons/index.ts for the new lesson.
-    Uses the actual hook_path returned from create_lesson_files.
+    Stages every file update for one generated lesson: lesson-problems.json, lesson-modules.json,
+    the lesson's markdown and hook files and src/lessons/index.ts. Returns the lesson paths.
     """
-    import os
-    # Get the index.ts path
-    index_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/lessons/index.ts'))
-
-    # Compute the import path relative to index.ts (without .ts extension)
-    import_path = os.path.relpath(hook_path, os.path.dirname(index_path)).replace('.ts', '').replace('\\', '/')
-    if not import_path.startswith('.'):
-        import_path = './' + import_path
-
-    # Derive hook name from filename
-    hook_name = os.path.splitext(os.path.basename(hook_path))[0]
-
-    with open(index_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    # Check if already present
-    import_line = f'import {{ {hook_name} }} from "{import_path}";\n'
-    if any(import_line.strip() == line.strip() for line in lines):
-        return  # Already present
-
-    # Insert import after last import
-    last_import_idx = 0
-    for i, line in enumerate(lines):
-        if line.startswith('import '):
-            last_import_idx = i
-    lines.insert(last_import_idx + 1, import_line)
-
-    # Add to lessonHooks
-    for i, line in enumerate(lines):
-        if 'export const lessonHooks:' in line:
-            # Find the next '{'
-            for j in range(i, len(lines)):
-                if '{' in lines[j]:
-                    insert_idx = j + 1
-                    break
-            else:
-                continue
-            # Insert new entry
-            entry_line = f'  "{lesson_id}": {hook_name},\n'
-            # Find where to insert (before closing })
-            for k in range(insert_idx, len(lines)):
-                if '};' in lines[k]:
-                    lines.insert(k, entry_line)
-                    break
-            break
-
-    with open(index_path, 'w', encoding='utf-8') as f:
-        f.writelines(lines)
+    from create_lesson_template import add_lesson_files, lesson_hook_name
+
+    lesson_json_obj = parsed_content["json"]
+    lessons = json.loads(transaction.read(LESSONS_JSON_PATH))
+    lesson_id = ensure_unique_lesson_id(lesson_json_obj["id"], {lesson["id"] for lesson in lessons})
+    typescript = parsed_content["typescript"]
+    if lesson_id != lesson_json_obj["id"]:
+        # The hook is written under the new id, so it has to export the hook name and import the markdown of that id
+        old_id = lesson_json_obj["id"]
+        typescript = typescript.replace(lesson_hook_name(old_id), lesson_hook_name(lesson_id))
+        typescript = typescript.replace(f'./{old_id}.md', f'./{lesson_id}.md').replace(f'"{old_id}"', f'"{lesson_id}"')
+    lesson_json_obj["id"] = lesson_id
+    lessons.append(lesson_json_obj)
+    transaction.write(LESSONS_JSON_PATH, json.dumps(lessons, indent=2))
+
+    return add_lesson_files(transaction, lesson_id, module_id, parsed_content["markdown"], typescript)
+
+def generate_lesson(client, file_path, module_id, lesson_id=None, cache=None):
+    """Generate, parse and validate the lesson for one source file"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        source_text = f.read()
+    generated_content = generate_lesson_content(client, source_text, module_id, lesson_id, cache)
+    # If using function calling, generated_content is a JSON string, so parse it first
+    if isinstance(generated_content, str):
+        generated_content = json.loads(generated_content)
+    parsed_content = parse_generated_content(generated_content)
+    try:
+        jsonschema.validate(instance=parsed_content["json"], schema=LESSON_JSON_SCHEMA)
+    except jsonschema.ValidationError as ve:
+        raise ValueError(f"lesson_json validation error: {ve.message}")
+    return parsed_content
+
+def generate_lessons(client, file_paths, module_id, lesson_id=None, cache=None, concurrency=4):
+    """Generate lessons for many source files concurrently. Returns (file_path, parsed_content, error) in input order."""
+    def generate(file_path):
+        try:
+            return file_path, generate_lesson(client, file_path, module_id, lesson_id, cache), None
+        except Exception as e:
+            return file_path, None, e
+
+    # LLM calls spend their time waiting on the network, so threads are enough
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        return list(executor.map(generate, file_paths))
 
 def main():
     args = parse_arguments()
-    lessons_json_path = os.path.join(os.path.dirname(__file__), '../src/data/lesson-problems.json')
+    if args.lesson_id and len(args.file_paths) > 1:
+        print("❌ Error: --lesson_id can only be used with a single source file", file=sys.stderr)
+        sys.exit(1)
     try:
-        # Step 1: Read source lesson text
-        with open(args.file_path, 'r', encoding='utf-8') as f:
-            source_text = f.read()
-
-        # Step 2: Initialize OpenAI client
-        client = initialize_openai_client()
-
-        # Step 3: Generate lesson content with LLM
-        if USE_LLM_CACHE:
-            print("Loading generated lesson content from file for testing...")
-            with open("generated_content.json", "r", encoding="utf-8") as f:
-                generated_content = json.load(f)
-            prompt = build_llm_prompt(source_text, args.module_id, args.lesson_id)
-            print(prompt)
+        # Step 1: Initialize OpenAI client, or the local stand-in
+        if args.offline is not None:
+            client = OfflineClient(args.offline or None)
+            # Stand-in responses are cheap and should not end up in the cache
+            cache = None
         else:
-            print(f"Generating lesson content with {MODEL} (function calling)...")
-            # pass in the lesson_id if specified
-            generated_content = generate_lesson_content(client, source_text, args.module_id, args.lesson_id)
-            json.dump(generated_content, open("generated_content.json", "w"), indent=2)
-
-        # Step 4: Parse LLM output
-        # If using function calling, generated_content is a JSON string, so parse it first
-        if isinstance(generated_content, str):
-            generated_content = json.loads(generated_content)
-        parsed_content = parse_generated_content(generated_content)
-        print("Successfully parsed LLM output.")
-
-        # Step 5: Extract lesson_id from the JSON artifact
-        lesson_json_obj = parsed_content["json"]
-        # Validate lesson_json_obj against schema
-        try:
-            jsonschema.validate(instance=lesson_json_obj, schema=LESSON_JSON_SCHEMA)
-        except jsonschema.ValidationError as ve:
-            print(f"❌ lesson_json validation error: {ve.message}", file=sys.stderr)
+            client = initialize_openai_client()
+            cache = None if args.no_cache else ResponseCache()
+
+        # Step 2: Generate, parse and validate all lessons concurrently
+        print(f"Generating {len(args.file_paths)} lesson(s) with {MODEL} (function calling), up to {args.concurrency} at a time...")
+        results = generate_lessons(client, args.file_paths, args.module_id, args.lesson_id, cache, args.concurrency)
+        failures = [(file_path, error) for file_path, _, error in results if error is not None]
+        for file_path, error in failures:
+            print(f"❌ {file_path}: {error}", file=sys.stderr)
+
+        # Step 3: Stage the updates of every successful lesson, then apply them together
+        transaction = FileTransaction()
+        created = []
+        for file_path, parsed_content, error in results:
+            if error is None:
+                created.append(stage_lesson(transaction, parsed_content, args.module_id))
+        transaction.commit()
+
+        # Step 4: Build the traces of the new lessons
+        if created:
+            from create_lesson_template import generate_lesson_traces
+            generate_lesson_traces([paths['lesson_id'] for paths in created])
+
+        # Step 5: Print summary with actual paths
+        print(f"\n✅ Generated {len(created)} lesson(s) in module '{args.module_id}'")
+        for paths in created:
+            print(f"- Lesson ID: {paths['lesson_id']}")
+            print(f"  Markdown file: {paths['md_path']}")
+            print(f"  Hook file: {paths['hook_path']}")
+        if failures:
+            print(f"❌ {len(failures)} source file(s) failed, nothing was written for them", file=sys.stderr)
             sys.exit(1)
-        lesson_id = lesson_json_obj["id"]
-        lesson_id = ensure_unique_lesson_id(lesson_id, lessons_json_path)
-        print(f"Using lesson ID from LLM: {lesson_id}")
-
-        # Step 6: Update lesson-problems.json
-        update_lessons_json(lesson_json_obj, lessons_json_path)
-        print(f"Updated lesson-problems.json with new entry for '{lesson_id}'.")
-
-        # Step 7: Create lesson files and get paths
-        paths = create_lesson_files(lesson_id, args.module_id, parsed_content["markdown"], parsed_content["typescript"])
-        print(f"Created/overwritten lesson files for '{lesson_id}' in module '{args.module_id}'.")
-
-        # Step 7.5: Update src/lessons/index.ts to import and register the new hook
-        update_lesson_hooks_index(lesson_id, paths["hook_path"])
-        print(f"Updated src/lessons/index.ts to register hook for '{lesson_id}'.")
-
-        # Step 8: Print summary with actual paths
-        print("\n✅ Lesson generation complete!")
-        print(f"- Lesson ID: {lesson_id}")
-        print(f"- Module ID: {args.module_id}")
-        print(f"- Markdown file: {paths['md_path']}")
-        print(f"- Hook file: {paths['hook_path']}")
-        print(f"- lesson-problems.json updated.")
     except Exception as e:
         print(f"❌ Error: {e}", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,4 @@
+/* eslint-disable @typescript-eslint/no-require-imports */
+// AUTO-GENERATED FILE. DO NOT EDIT MANUALLY.
+export const SHARED_ASTS: Record<string, unknown> = {
+};
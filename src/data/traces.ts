@@ -1,5 +1,6 @@
 import type { TraceData } from "@/types/trace";
 
+import { SHARED_ASTS } from './asts';
 import { BLOG_TRACES } from './blog_traces';
 // Import all trace files manually
 import booleanExpressionsTrace from './traces/boolean-expressions.json';
@@ -76,5 +77,12 @@ export const AVAILABLE_PROBLEM_IDS: string[] = Object.keys(TRACES);
 // Helper function to get trace data for a specific problem
 export function getTraceData(problemId: string): TraceData | undefined {
   const baseTraceData = TRACES[problemId];
+  // Traces generated with --shared-ast reference their AST by source hash
+  if (baseTraceData && "ref" in baseTraceData.ast) {
+    return {
+      ...baseTraceData,
+      ast: SHARED_ASTS[baseTraceData.ast.ref] as TraceData["ast"],
+    };
+  }
   return baseTraceData;
 }
@@ -4,7 +4,10 @@ import { useCallback, useEffect, useRef, useState } from 'react';
 import astTransformerCode from '@/tracer/ast_transformer.py';
 import pythonTracerCode from '@/tracer/python_tracer.py';
 import relationshipAnalyzerCode from '@/tracer/relationship_analyzer.py';
+import traceCodecCode from '@/tracer/trace_codec.py';
+import tracerApiCode from '@/tracer/tracer_api.py';
 import utilsCode from '@/tracer/utils.py';
+import { decodeTrace } from '@/utils/traceCodec';
 
 import { usePyodideScript } from './usePyodideInstance';
 
@@ -37,6 +40,8 @@ export function usePyodide(): UsePyodideResult {
     { name: "ast_transformer", code: astTransformerCode },
     { name: "relationship_analyzer", code: relationshipAnalyzerCode },
     { name: "python_tracer", code: pythonTracerCode },
+    { name: "trace_codec", code: traceCodecCode },
+    { name: "tracer_api", code: tracerApiCode },
   ];
 
   useEffect(() => {
@@ -51,26 +56,80 @@ export function usePyodide(): UsePyodideResult {
     initializePyodide();
   }, [pyodideScriptLoading]);
 
+  // Precompiled tracer modules, built by src/tracer/build_bundle.py before production builds
+  const TRACER_BUNDLE_URL = "/tracer-bundle.zip";
+  const TRACER_BUNDLE_PATH = "/tracer-bundle.zip";
+
+  const loadTracerBundle = async (pyodide: PyodideInterface) => {
+    const response = await fetch(TRACER_BUNDLE_URL).catch(() => null);
+    if (!response?.ok) return false;
+    pyodide.FS.writeFile(
+      TRACER_BUNDLE_PATH,
+      new Uint8Array(await response.arrayBuffer()),
+    );
+    try {
+      pyodide.runPython(`
+import sys
+sys.path.insert(0, "${TRACER_BUNDLE_PATH}")
+import tracer_api
+      `);
+      return true;
+    } catch (error) {
+      // Bytecode only loads on the Python version it was compiled with
+      console.warn("Tracer bundle did not load, using sources:", error);
+      pyodide.runPython(`
+import sys
+sys.path.remove("${TRACER_BUNDLE_PATH}")
+for name in ${JSON.stringify(TRACER_FILES.map((file) => file.name))}:
+    sys.modules.pop(name, None)
+      `);
+      return false;
+    }
+  };
+
   const loadTracer = async (pyodide: PyodideInterface) => {
     if (!pyodide) throw new Error("Pyodide not ready");
 
+    const start = performance.now();
     try {
+      // Sources are always used in development so that edits to the tracer take effect
+      if (
+        process.env.NODE_ENV === "production" &&
+        (await loadTracerBundle(pyodide))
+      ) {
+        console.log(
+          `Tracer bundle loaded in ${(performance.now() - start).toFixed(1)} ms`,
+        );
+        return;
+      }
+
       // Load all Python tracer files and register them as modules
       for (const file of TRACER_FILES) {
+        // Pass the name and source as variables so the source never needs escaping
+        const namespace = pyodide.toPy({
+          module_name: file.name,
+          module_code: file.code,
+        });
         // Register the module in sys.modules so it can be imported
-        pyodide.runPython(`
+        pyodide.runPython(
+          `
 import sys
 import types
 
 # Create a new module
-module = types.ModuleType('${file.name}')
-sys.modules['${file.name}'] = module
+module = types.ModuleType(module_name)
+sys.modules[module_name] = module
 
 # Execute the code in the module's namespace
-exec("""${file.code.replace(/"/g, '\\"')}""", module.__dict__)
-        `);
+exec(compile(module_code, module_name + ".py", "exec"), module.__dict__)
+        `,
+          { globals: namespace },
+        );
+        namespace.destroy();
       }
-      console.log("All tracer modules loaded successfully");
+      console.log(
+        `All tracer modules loaded from source in ${(performance.now() - start).toFixed(1)} ms`,
+      );
     } catch (error) {
       console.error("Failed to load tracer modules:", error);
       throw error;
@@ -202,16 +261,9 @@ exec("""${file.code.replace(/"/g, '\\"')}""", module.__dict__)
       }>,
     ) => {
       try {
-        // Option 3: Complete reset for maximum cleanliness
-        console.log("Performing complete Pyodide reset...");
-        await resetPyodide();
-
-        // Wait a moment for reset to complete and get fresh instance
-        await new Promise((resolve) => setTimeout(resolve, 1000));
-
-        // Get the current pyodide instance after reset
+        // The tracer modules stay loaded and tracer_api keeps a warm tracer between runs
         const currentPyodide = pyodide;
-        if (!currentPyodide) throw new Error("Pyodide reset failed");
+        if (!currentPyodide) throw new Error("Pyodide not ready");
 
         console.log("Inputs:", inputs);
         console.log("Original inputs:", originalInputs);
@@ -241,81 +293,50 @@ exec("""${file.code.replace(/"/g, '\\"')}""", module.__dict__)
 
         console.log("Parsed inputs:", parsedInputs);
 
-        // Convert inputs to Python objects using toPy
-        const pythonGlobals = currentPyodide.toPy(parsedInputs);
-
-        // Run the trace generation with proper globals
-        const traceGenCode = `
-from python_tracer import PythonTracer
-import json
-
-# Initialize variables
-result_json = None
-
-try:
-    tracer = PythonTracer()
-    problem_code = """${problemCode.replace(/"/g, '\\"')}"""
-
-    # Extract function name from code
-    import ast
-    tree = ast.parse(problem_code)
-    function_name = "${entrypoint}"
-
-    # Get all defined functions
-    defined_functions = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            defined_functions.append(node.name)
-    
-    # If the provided function name does not exist, maybe the code calls the function directly
-    if function_name not in defined_functions:
-        function_name = None
-
-    # Get the input values directly from globals
-    input_kwargs = {${Object.entries(inputs)
-      .map(([key, _]) => `"${key}": ${key}`)
-      .join(", ")}}
-    
-    print(f"Function: {function_name}")
-    print(f"Input kwargs: {input_kwargs}")
-
-    # Get special_inputs from problem if available
-    special_inputs = ${specialInputs ? JSON.stringify(specialInputs) : "None"}
-    
-    # Get manual_relationships from problem if available
-    manual_relationships = ${
-      manualRelationships ? JSON.stringify(manualRelationships) : "None"
-    }
-    
-    # Run the tracer with explicit kwargs
-    transformed_ast = tracer.run_code(
-        problem_code, 
-        function_name,
-        special_inputs,
-        hash(problem_code), # hash of the source code
-        manual_relationships,
-        **input_kwargs
-    )
-    
-    # Get the trace data using the new method
-    trace_data = tracer.get_trace_data(transformed_ast)
-    result_json = json.dumps(trace_data)
-        
-except Exception as e:
-    result_json = json.dumps({"error": f"Python execution failed: {str(e)}"})
-
-result_json
-      `;
-
-        const result = currentPyodide.runPython(traceGenCode, {
-          globals: pythonGlobals,
-        });
+        // Pass the arguments as Python objects instead of pasting them into source code
+        const pyInputs = currentPyodide.toPy(parsedInputs);
+        const pySpecialInputs = specialInputs
+          ? currentPyodide.toPy(specialInputs)
+          : null;
+        const pyManualRelationships = manualRelationships
+          ? currentPyodide.toPy(manualRelationships)
+          : null;
+        const tracerApi = currentPyodide.pyimport("tracer_api");
+        // Every attribute access returns a new proxy, so keep this one to destroy it
+        const traceCodeEncoded = tracerApi.trace_code_encoded;
+        let encoded: any = null;
+        try {
+          // The trace comes back as bytes, which are decoded through a view of the Python buffer
+          encoded = traceCodeEncoded.callKwargs({
+            code: problemCode,
+            entrypoint,
+            inputs: pyInputs,
+            special_inputs: pySpecialInputs,
+            manual_relationships: pyManualRelationships,
+          });
+        } finally {
+          for (const proxy of [
+            pyInputs,
+            pySpecialInputs,
+            pyManualRelationships,
+            traceCodeEncoded,
+            tracerApi,
+          ]) {
+            proxy?.destroy();
+          }
+        }
 
-        if (!result || result === "undefined") {
+        if (!encoded) {
           throw new Error("Python code returned undefined result");
         }
 
-        return JSON.parse(result);
+        const buffer = encoded.getBuffer("u8");
+        try {
+          return decodeTrace(buffer.data);
+        } finally {
+          buffer.release();
+          encoded.destroy();
+        }
       } catch (err) {
         throw new Error(`Trace generation failed: ${err}`);
       }
@@ -4,10 +4,46 @@ import { immer } from 'zustand/middleware/immer';
 import { AVAILABLE_PROBLEM_IDS } from '@/data/traces';
 
 import type { TraceData, TraceLine } from "@/types/trace";
-import type { AST } from "@/types/ast";
+import type { AST, CompactAST, SharedASTRef } from "@/types/ast";
 import type { Problem } from "@/types/problem";
+// Helper to build node ID lookup from the flat arrays of a compact AST
+function buildCompactNodeLookup(ast: CompactAST): Map<number, AST> {
+  const lookup = new Map<number, AST>();
+
+  ast.node_types.forEach((typeIndex, nodeId) => {
+    if (typeIndex === -1) return;
+
+    const node: AST = {
+      ...ast.fields[String(nodeId)],
+      node_id: nodeId,
+      type: ast.types[typeIndex]!,
+    };
+    const parentId = ast.parents[nodeId]!;
+    if (parentId !== -1) {
+      node.parent_node_id = parentId;
+    }
+    const lineno = ast.locations[4 * nodeId];
+    if (lineno != null) {
+      node.location = {
+        lineno,
+        col_offset: ast.locations[4 * nodeId + 1]!,
+        end_lineno: ast.locations[4 * nodeId + 2]!,
+        end_col_offset: ast.locations[4 * nodeId + 3]!,
+      };
+    }
+    lookup.set(nodeId, node);
+  });
+
+  return lookup;
+}
+
 // Helper to build node ID lookup
-function buildNodeLookup(ast: AST): Map<number, AST> {
+function buildNodeLookup(ast: AST | CompactAST | SharedASTRef): Map<number, AST> {
+  if ("format" in ast && ast.format === "compact") {
+    return buildCompactNodeLookup(ast as CompactAST);
+  }
+  // Shared references are resolved by getTraceData before reaching the store
+
   const lookup = new Map<number, AST>();
 
   function traverse(node: AST) {
@@ -29,7 +65,7 @@ function buildNodeLookup(ast: AST): Map<number, AST> {
     }
   }
 
-  traverse(ast);
+  traverse(ast as AST);
   return lookup;
 }
 
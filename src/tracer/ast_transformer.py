@@ -1,4 +1,5 @@
 import ast
+from collections import deque
 
 # Marker function names - using same names as Thonny for consistency
 BEFORE_STATEMENT_MARKER = "_thonny_hidden_before_stmt"
@@ -6,42 +7,59 @@ AFTER_STATEMENT_MARKER = "_thonny_hidden_after_stmt"
 BEFORE_EXPRESSION_MARKER = "_thonny_hidden_before_expr"
 AFTER_EXPRESSION_MARKER = "_thonny_hidden_after_expr"
 
+# Expression contexts labelled on each node before transformation
+TARGET_CONTEXT = "target"  # stored to or deleted, not evaluated
+PARAMETER_CONTEXT = "parameter"  # part of a function's argument list
+CALLEE_CONTEXT = "callee"  # function name or method receiver in a call
+TEST_CONTEXT = "test"  # condition of an if/while/assert/ternary
+SKIPPED_CONTEXTS = (TARGET_CONTEXT, PARAMETER_CONTEXT, CALLEE_CONTEXT)
+
+# Top-level statements that can be reused between runs in incremental mode
+DEFINITION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
 class ASTTransformer(ast.NodeTransformer):
     """Handles AST transformation and node tracking"""
-    def __init__(self):
+    def __init__(self, incremental=False):
+        # In incremental mode, unchanged top-level definitions keep their instrumented subtrees and node IDs between runs
+        self.incremental = incremental
+        self._definitions = {}  # source of a top-level definition -> cached subtrees from the previous run
+        self._definitions_node_count = 0  # number of node IDs in use when the definitions were cached
         self.reset()
         
     def reset(self):
         """Reset the transformer's state"""
-        self.node_id_counter = 0
-        self._nodes = {}  # node_id -> node mapping
+        self._nodes = []  # node_id -> node, indexed by node_id
+        self._node_ids = {}  # node -> node_id, for both the transformed and the original AST
         self.tests = {} # node_id -> test mapping
-        
-    def get_node_id(self, node, problem_key=None):
-        """Get a unique ID for an AST node"""
-        node_id = getattr(node, '_tracer_id', None)
-        pk = getattr(node, '_problem_key', None)
-        # reset for new problem, since the node_id carries over to the next problem
-        if pk is not None and problem_key is not None and pk != problem_key:
-            node_id = None
+        self.original_ast = None  # untransformed AST sharing node IDs with the transformed one
 
+    def _register_node(self, node):
+        """Assign the next node ID to a node, or return its ID if it already has one"""
+        node_id = self._node_ids.get(node)
         if node_id is None:
-            node_id = self.node_id_counter
-            self.node_id_counter += 1
-            setattr(node, '_tracer_id', node_id)
-            setattr(node, '_problem_key', problem_key)
-            self._nodes[node_id] = node
+            node_id = len(self._nodes)
+            self._nodes.append(node)
+            self._node_ids[node] = node_id
         return node_id
         
+    def get_node_id(self, node):
+        """Get the ID assigned to an AST node, returns None for nodes outside the source (e.g. markers)"""
+        return self._node_ids.get(node)
+        
+    def node_count(self):
+        """Number of node IDs assigned so far, IDs range over 0..node_count()-1"""
+        return len(self._nodes)
+        
     def get_node(self, node_id):
         """Get node by ID, returns None if not found"""
-        return self._nodes.get(node_id)
+        if 0 <= node_id < len(self._nodes):
+            return self._nodes[node_id]
+        return None
         
-    def ast_to_dict(self, node, source_lines=None):
+    def ast_to_dict(self, node, source_lines=None, parent=None):
         """Convert AST node to dict while maintaining structure and node IDs"""
         if isinstance(node, ast.AST):
             node_id = self.get_node_id(node)
-            parent = getattr(node, "parent", None)
             
             fields = {}
             children = []
@@ -50,13 +68,13 @@ class ASTTransformer(ast.NodeTransformer):
                 if isinstance(value, list):
                     field_values = []
                     for item in value:
-                        child_dict = self.ast_to_dict(item, source_lines)
+                        child_dict = self.ast_to_dict(item, source_lines, node)
                         if child_dict is not None:
                             children.append(item)
                             field_values.append(child_dict)
                     fields[field] = field_values
                 else:
-                    child_dict = self.ast_to_dict(value, source_lines)
+                    child_dict = self.ast_to_dict(value, source_lines, node)
                     if child_dict is not None:
                         children.append(value)
                         fields[field] = child_dict
@@ -92,6 +110,58 @@ class ASTTransformer(ast.NodeTransformer):
         else:
             return str(node)
             
+    def ast_to_compact(self, root):
+        """
+        Convert an AST to flat arrays indexed by node ID instead of nested dicts.
+        Children and source segments are left out, since they can be rebuilt from parents, locations and the code.
+        """
+        node_count = len(self._nodes)
+        types = []  # distinct type names, referenced by index
+        type_indices = {}
+        node_types = [-1] * node_count  # -1 for IDs that are not part of this tree
+        parents = [-1] * node_count
+        locations = [None] * (4 * node_count)  # lineno, col_offset, end_lineno, end_col_offset per node
+        fields = {}  # node_id -> scalar fields that are not None (names, attributes, constant values, ...)
+
+        todo = deque([(root, -1)])
+        while todo:
+            node, parent_id = todo.popleft()
+            node_id = self.get_node_id(node)
+            # Load/Store/Del and operator nodes are shared, so they are only recorded the first time they are seen
+            if node_id is None or node_types[node_id] != -1:
+                continue
+
+            type_name = node.__class__.__name__
+            if type_name not in type_indices:
+                type_indices[type_name] = len(types)
+                types.append(type_name)
+            node_types[node_id] = type_indices[type_name]
+            parents[node_id] = parent_id
+            if hasattr(node, 'lineno'):
+                locations[4 * node_id:4 * node_id + 4] = [node.lineno, node.col_offset, node.end_lineno, node.end_col_offset]
+
+            node_fields = {}
+            for field, value in ast.iter_fields(node):
+                values = value if isinstance(value, list) else [value]
+                if any(isinstance(item, ast.AST) for item in values):
+                    todo.extend((item, node_id) for item in values if isinstance(item, ast.AST))
+                elif isinstance(value, list):
+                    if value:
+                        node_fields[field] = [self.ast_to_dict(item) for item in value]
+                elif value is not None:
+                    node_fields[field] = self.ast_to_dict(value)
+            if node_fields:
+                fields[node_id] = node_fields
+
+        return {
+            "format": "compact",
+            "types": types,
+            "node_types": node_types,
+            "parents": parents,
+            "locations": locations,
+            "fields": fields,
+        }
+            
     def visit_stmt(self, node):
         """Visit a statement node"""
         if not isinstance(node, ast.stmt):
@@ -129,7 +199,7 @@ class ASTTransformer(ast.NodeTransformer):
         node = self.generic_visit(node)
         
         # Skip assignment targets, function parameters, and function names
-        if self._is_assignment_target(node) or self._is_function_parameter(node) or self._is_function_name(node):
+        if getattr(node, "context", None) in SKIPPED_CONTEXTS:
             return node
         
         # Skip constants (int, float, str, bool, None, etc.)
@@ -151,133 +221,58 @@ class ASTTransformer(ast.NodeTransformer):
             keywords=[]
         )
     
-    def _is_assignment_target(self, node):
-        """Check if a node is an assignment target (being stored to, not evaluated)"""
-        # Direct check for Store/Del context
-        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
-            return True
-            
-        # Check for subscript in Store/Del context (e.g., freq[num] = 1 or del dict[key])
-        # BUT allow the slice to be evaluated since it needs to be computed (except in Del context)
-        if isinstance(node, ast.Subscript) and isinstance(node.ctx, (ast.Store, ast.Del)):
+    def _is_target_edge(self, parent, child):
+        """Check if child sits in a position of parent that is stored to rather than evaluated"""
+        # Elements of a tuple/list being unpacked into (e.g., 'a, b = ...')
+        if isinstance(parent, (ast.Tuple, ast.List)) and isinstance(parent.ctx, ast.Store):
             return True
-            
-        # Check for attribute in Store/Del context (e.g., obj.attr = value or del obj.attr)
-        # BUT allow the object to be evaluated since it needs to be accessed (except in Del context)
-        if isinstance(node, ast.Attribute) and isinstance(node.ctx, (ast.Store, ast.Del)):
-            return True
-            
-        # Special case: if we're the slice of a subscript in Store context,
-        # we should still be evaluated (e.g., the 'num' in 'num_to_index[num] = i')
-        # BUT for Del context, we must NOT evaluate anything to keep it a valid target
-        parent = getattr(node, 'parent', None)
-        if parent and isinstance(parent, ast.Subscript):
-            if isinstance(parent.ctx, ast.Store):
-                if parent.slice == node:
-                    return False  # Allow evaluation of the slice
-                # Also allow evaluation of the container part (e.g., 'num_to_index' in 'num_to_index[num] = i')
-                if parent.value == node:
-                    return False  # Allow evaluation of the container
-            elif isinstance(parent.ctx, ast.Del):
-                # For Del context, we must not wrap any part to keep it a valid del target
-                return True
-                
-        # Special case: if we're the object of an attribute in Store context,
-        # we should still be evaluated (e.g., the 'self' in 'self.left = value')
-        # BUT for Del context, we must NOT evaluate anything to keep it a valid target
-        if parent and isinstance(parent, ast.Attribute):
-            if isinstance(parent.ctx, ast.Store):
-                if parent.value == node:
-                    return False  # Allow evaluation of the object
-            elif isinstance(parent.ctx, ast.Del):
-                # For Del context, we must not wrap any part to keep it a valid del target
-                return True
-            
-        # Check if we're inside a Store context (for complex targets like tuple unpacking)
-        current = node
-        while hasattr(current, 'parent'):
-            parent = current.parent
-            
-            # If parent is a tuple/list in Store context, we're an assignment target
-            if isinstance(parent, (ast.Tuple, ast.List)) and isinstance(parent.ctx, ast.Store):
-                return True
-                
-            # If parent is an assignment and we're in the targets
-            if isinstance(parent, ast.Assign) and current in parent.targets:
-                return True
-                
-            # If parent is an augmented assignment and we're the target
-            if isinstance(parent, ast.AugAssign) and current == parent.target:
-                return True
-                
-            # If parent is a for loop and we're the target
-            if isinstance(parent, ast.For) and current == parent.target:
-                return True
-                
-            # If parent is a comprehension and we're the target
-            if isinstance(parent, ast.comprehension) and current == parent.target:
-                return True
-                
-            # If parent is a with statement and we're the optional_vars
-            if isinstance(parent, ast.withitem) and current == parent.optional_vars:
-                return True
-                
-            # If parent is an exception handler and we're the name
-            if isinstance(parent, ast.ExceptHandler) and current == parent.name:
-                return True
-                
-            current = parent
-            
+        # Assignment, augmented assignment, for loop and comprehension targets
+        if isinstance(parent, ast.Assign):
+            return child in parent.targets
+        if isinstance(parent, (ast.AugAssign, ast.For, ast.comprehension)):
+            return child is parent.target
+        # The 'as' part of a with statement
+        if isinstance(parent, ast.withitem):
+            return child is parent.optional_vars
         return False
-    
-    def _is_function_parameter(self, node):
-        """Check if a node is a function parameter"""
-        parent = getattr(node, "parent", None)
-        if not parent:
-            return False
-            
-        # Check if we're in function arguments
+
+    def _classify_context(self, node, parent, in_target):
+        """Classify how an expression node is used, based on its parent and the targets enclosing it"""
+        # Direct check for Store/Del context (e.g., x = 1, freq[num] = 1, obj.attr = value, del dict[key])
+        if isinstance(node, (ast.Name, ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            return TARGET_CONTEXT
+
+        # The parts of a subscript/attribute being stored to still need to be evaluated
+        # (e.g., 'num_to_index' and 'num' in 'num_to_index[num] = i', or 'self' in 'self.left = value')
+        # BUT for Del context, we must NOT evaluate anything to keep it a valid del target
+        if isinstance(parent, (ast.Subscript, ast.Attribute)):
+            if isinstance(parent.ctx, ast.Del):
+                return TARGET_CONTEXT
+            if isinstance(parent.ctx, ast.Store):
+                return None
+
+        # Anything nested inside a target (for complex targets like tuple unpacking)
+        if in_target:
+            return TARGET_CONTEXT
+
+        # Default values in function arguments
         if isinstance(parent, ast.arguments):
-            return True
-            
-        # Check if we're lambda arguments
-        if isinstance(parent, ast.Lambda) and hasattr(parent, 'args'):
-            # Walk through all argument nodes in the lambda
-            for arg_node in ast.walk(parent.args):
-                if arg_node is node:
-                    return True
-                    
-        return False
-        
-    def _is_function_name(self, node):
-        """Check if a node is a function name that shouldn't be evaluated"""
-        if not isinstance(node, ast.Name):
-            return False
-            
-        parent = getattr(node, "parent", None)
-        if not parent:
-            return False
-            
-        # Check if we're the function name in a function call
-        if isinstance(parent, ast.Call) and parent.func == node:
-            return True
-            
-        # Check if we're part of a method call
-        # Examples:
-        # 1. obj.method() - 'method' is the attribute name
-        # 2. my_list.append(x) - 'append' is the attribute name
-        # 3. "hello".upper() - 'upper' is the attribute name
-        # 4. self.process() - 'self' is the object being called on
-        # 5. my_dict.update({}) - both 'my_dict' and 'update' are checked
-        if isinstance(parent, ast.Attribute):
+            return PARAMETER_CONTEXT
+
+        if isinstance(node, ast.Name):
+            # The function name in a function call
+            if isinstance(parent, ast.Call) and parent.func is node:
+                return CALLEE_CONTEXT
+            # The object a method is being called on (e.g., 'self' in 'self.process()')
             grandparent = getattr(parent, "parent", None)
-            if grandparent and isinstance(grandparent, ast.Call) and grandparent.func == parent:
-                # Return True if we're either:
-                # 1. The attribute name (method) in a method call
-                # 2. The object the method is being called on
-                return parent.attr == node.id or parent.value == node
-                    
-        return False
+            if isinstance(parent, ast.Attribute) and isinstance(grandparent, ast.Call) and grandparent.func is parent:
+                return CALLEE_CONTEXT
+
+        # The test of an if/while/assert/ternary
+        if getattr(parent, "test", None) is node:
+            return TEST_CONTEXT
+
+        return None
         
     def visit(self, node):
         """Visit a node"""
@@ -288,111 +283,135 @@ class ASTTransformer(ast.NodeTransformer):
         else:
             return self.generic_visit(node)
             
-    def transform(self, source, problem_key):
+    def _walk_pairs(self, root, original, skipped):
+        """Walk two matching trees in lockstep, in ast.walk order, leaving out skipped nodes"""
+        todo = deque([(root, original)])
+        while todo:
+            node, original = todo.popleft()
+            yield node, original
+            for pair in zip(ast.iter_child_nodes(node), ast.iter_child_nodes(original)):
+                if pair[0] not in skipped:
+                    todo.append(pair)
+
+    def _definition_source(self, source_lines, node):
+        """Get the first line and full source text (including decorators) of a top-level definition"""
+        start = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno])
+        return start, ''.join(source_lines[start - 1:node.end_lineno])
+
+    def _reuse_definitions(self, source_lines, root):
+        """Match top-level definitions against the previous run, returns {body index: cached definition}"""
+        reused = {}
+        for index, node in enumerate(root.body):
+            if not isinstance(node, DEFINITION_TYPES):
+                continue
+            start, text = self._definition_source(source_lines, node)
+            definition = self._definitions.pop(text, None)
+            if definition is None:
+                continue
+            # Lines above the definition may have been added or removed
+            if start != definition['start']:
+                for cached in definition['instrumented'] + [definition['original']]:
+                    ast.increment_lineno(cached, start - definition['start'])
+                definition['start'] = start
+            reused[index] = definition
+        return reused
+
+    def _cache_definitions(self, source_lines, instrumented_body, reused):
+        """Remember this run's top-level definitions so the next run can reuse them"""
+        self._definitions = {}
+        self._definitions_node_count = len(self._nodes)
+        # Once most IDs belong to replaced code, start over so IDs stay compact
+        if self._nodes.count(None) * 2 > len(self._nodes):
+            return
+        for index, original in enumerate(self.original_ast.body):
+            if not isinstance(original, DEFINITION_TYPES):
+                continue
+            definition = reused.get(index)
+            if definition is None:
+                start, _ = self._definition_source(source_lines, original)
+                nodes = []
+                contexts = set()  # Load/Store/Del nodes are shared with the rest of the source
+                for child in ast.walk(original):
+                    if isinstance(child, ast.expr_context):
+                        contexts.add(child)
+                        continue
+                    node_id = self._node_ids[child]
+                    nodes.append((node_id, self._nodes[node_id], child))
+                definition = {
+                    'start': start,
+                    'instrumented': instrumented_body[index],
+                    'original': original,
+                    'nodes': nodes,
+                    'contexts': contexts,
+                    'tests': [node_id for node_id, _, _ in nodes if node_id in self.tests],
+                }
+            self._definitions[self._definition_source(source_lines, original)[1]] = definition
+
+    def transform(self, source):
         """Transform source code by adding marker function calls"""
+        # Node IDs are scoped to a single transform
+        self.reset()
         root = ast.parse(source)
+        # Keep an untouched copy of the tree for relationship analysis and JSON output
+        self.original_ast = ast.parse(source)
+
+        source_lines = source.splitlines(keepends=True)
+        reused = self._reuse_definitions(source_lines, root) if self.incremental else {}
+        if reused:
+            # Reused definitions keep their node IDs, new nodes are numbered after the previous run's
+            self._nodes = [None] * self._definitions_node_count
+            for index, definition in reused.items():
+                self.original_ast.body[index] = definition['original']
+                for node_id, node, original in definition['nodes']:
+                    self._nodes[node_id] = node
+                    self._node_ids[node] = node_id
+                    self._node_ids[original] = node_id
+                for node_id in definition['tests']:
+                    self.tests[node_id] = node_id
         
         # First assign IDs to all nodes. We need to do this before installing markers so they don't get IDs
-        for node in ast.walk(root):
-            if isinstance(node, ast.AST):
-                self.get_node_id(node, problem_key)
+        # Both trees come from the same source, so walking them in lockstep pairs up matching nodes
+        # ast.walk visits parents before children, so contexts can be labelled top-down in the same pass
+        skipped = {root.body[index] for index in reused}
+        target_nodes = set()  # nodes nested inside an assignment target
+        for node, original in self._walk_pairs(root, self.original_ast, skipped):
+            node_id = self._register_node(node)
+            self._node_ids[original] = node_id
+            if getattr(node, "context", None) == TEST_CONTEXT:
+                self.tests[node_id] = node_id
                 
             # Set parent for all AST nodes for context detection
             for child in ast.iter_child_nodes(node):
                 setattr(child, "parent", node)
-
-            parent = getattr(node, "parent", None)
-            if hasattr(parent, "test") and parent.test == node:
-                self.tests[self.get_node_id(node)] = self.get_node_id(parent.test)
+                in_target = node in target_nodes or self._is_target_edge(node, child)
+                if in_target:
+                    target_nodes.add(child)
+                if isinstance(child, ast.expr):
+                    setattr(child, "context", self._classify_context(child, node, in_target))
+            for child in ast.iter_child_nodes(original):
+                setattr(child, "parent", original)
+        for definition in reused.values():
+            for context in definition['contexts']:
+                self._register_node(context)
         
-        # Transform the AST with markers
-        root = self.visit(root)
-        
-        # Handle top-level statements in Module to flatten the AST
-        if isinstance(root, ast.Module):
-            new_body = []
-            for node in root.body:
-                if isinstance(node, list):
-                    new_body.extend(node)
-                else:
-                    new_body.append(node)
-            root.body = new_body
-        
-        ast.fix_missing_locations(root)
-        return root 
-
-    def _is_marker_node(self, node):
-        """Check if a node is a marker function call that should not get a node ID"""
-        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
-            if isinstance(node.value.func, ast.Name):
-                func_name = node.value.func.id
-                return func_name in [BEFORE_STATEMENT_MARKER, AFTER_STATEMENT_MARKER]
-        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-            func_name = node.func.id
-            return func_name in [BEFORE_EXPRESSION_MARKER, AFTER_EXPRESSION_MARKER]
-        return False
-
-    def unwrap_transformed_ast(self, transformed_ast):
-        """Unwrap a transformed AST back to original structure while preserving node IDs"""
-        unwrapped = self._unwrap_ast_node(transformed_ast)
-        
-        # Set up parent relationships for the unwrapped AST
-        for node in ast.walk(unwrapped):
-            for child in ast.iter_child_nodes(node):
-                setattr(child, 'parent', node)
-                
-        return unwrapped
-    
-    def _unwrap_ast_node(self, node):
-        """Recursively unwrap AST nodes, removing markers but preserving structure and node IDs"""
-        if not isinstance(node, ast.AST):
-            return node
-            
-        # Handle marker nodes by unwrapping them
-        if self._is_marker_node(node):
-            if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
-                # Statement marker: skip it entirely
-                return None
-            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
-                func_name = node.func.id
-                if func_name == AFTER_EXPRESSION_MARKER:
-                    # Expression marker: unwrap to get the original expression
-                    if len(node.args) >= 2:
-                        # The second argument is the original expression
-                        return self._unwrap_ast_node(node.args[1])
-                elif func_name == BEFORE_EXPRESSION_MARKER:
-                    # Before expression marker: skip it
-                    return None
-            return None
-        
-        # For regular nodes, create a copy and recursively unwrap children
-        # Create a new node of the same type
-        new_node = type(node)()
-        
-        # Copy the node ID if it exists
-        if hasattr(node, '_tracer_id'):
-            setattr(new_node, '_tracer_id', node._tracer_id)
-            
-        # Copy location information
-        for attr in ['lineno', 'col_offset', 'end_lineno', 'end_col_offset']:
-            if hasattr(node, attr):
-                setattr(new_node, attr, getattr(node, attr))
-        
-        # Recursively unwrap all fields
-        for field, value in ast.iter_fields(node):
-            if isinstance(value, list):
-                new_list = []
-                for item in value:
-                    unwrapped = self._unwrap_ast_node(item)
-                    if unwrapped is not None:
-                        new_list.append(unwrapped)
-                setattr(new_node, field, new_list)
+        # Transform the AST with markers, splicing in reused definitions as they are
+        # Top-level statements come back as lists, which are flattened into the Module body
+        instrumented_body = []
+        for index, node in enumerate(root.body):
+            if index in reused:
+                instrumented_body.append(reused[index]['instrumented'])
             else:
-                unwrapped = self._unwrap_ast_node(value)
-                if unwrapped is not None:
-                    setattr(new_node, field, unwrapped)
-                elif not isinstance(value, ast.AST):
-                    # Keep non-AST values (strings, numbers, etc.)
-                    setattr(new_node, field, value)
-        
-        return new_node 
\ No newline at end of file
+                instrumented_body.append(self.visit(node))
+        new_body = []
+        for index, node in enumerate(instrumented_body):
+            nodes = node if isinstance(node, list) else [node] if node is not None else []
+            # Reused definitions already had their locations filled in
+            if index not in reused:
+                for statement in nodes:
+                    ast.fix_missing_locations(statement)
+            new_body.extend(nodes)
+        root.body = new_body
+
+        if self.incremental:
+            self._cache_definitions(source_lines, instrumented_body, reused)
+        return root
@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import argparse
+import contextlib
+import io
+
+from ast_transformer import ASTTransformer
+from relationship_analyzer import RelationshipAnalyzer
+
+PROBLEM_DIR = os.path.abspath(os.path.join(__file__, "..", "..", "data"))
+
+def load_problems():
+    """Load every problem and lesson that trace.py generates traces for"""
+    with open(os.path.join(PROBLEM_DIR, "problems.json"), "r") as f:
+        problems = json.load(f)['problems']
+    with open(os.path.join(PROBLEM_DIR, "lesson-problems.json"), "r") as f:
+        problems.extend(json.load(f))
+    return problems
+
+def benchmark_problem(transformer, analyzer, problem, repeat):
+    """Return the best analyze_ast time for a problem and its relationship count"""
+    code = problem['template'] if 'template' in problem else problem['solution']
+    transformer.transform(code)
+    best = float('inf')
+    # Manual relationships are announced on stdout, keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            relationships = analyzer.analyze_ast(
+                transformer.original_ast, transformer, problem.get('manualRelationships'))
+            best = min(best, time.perf_counter() - start)
+    return best, len(relationships)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark relationship analysis over all problems and lessons.')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per problem, the best time is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest problems to list')
+    args = parser.parse_args()
+
+    transformer = ASTTransformer()
+    analyzer = RelationshipAnalyzer()
+    results = []
+    skipped = []
+    for problem in load_problems():
+        try:
+            best, count = benchmark_problem(transformer, analyzer, problem, args.repeat)
+        except SyntaxError:
+            # Fill-in-the-blank lessons do not parse until completed
+            skipped.append(problem['id'])
+            continue
+        results.append((best, count, problem['id']))
+
+    total = sum(best for best, _, _ in results)
+    print(f"Analyzed {len(results)} problems in {total * 1000:.2f} ms (best of {args.repeat} per problem)")
+    if skipped:
+        print(f"Skipped {len(skipped)} problems that do not parse: {', '.join(skipped)}")
+    print(f"Slowest {args.top}:")
+    for best, count, problem_id in sorted(results, reverse=True)[:args.top]:
+        print(f"  {problem_id:<40} {best * 1000:8.3f} ms  {count} relationships")
@@ -0,0 +1,171 @@
+import io
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import contextlib
+import tracemalloc
+
+from python_tracer import PythonTracer
+from relationship_analyzer import clear_relationship_cache
+from benchmark_relationships import load_problems
+
+# Timings depend on the machine, so the default baseline is local and ignored by git
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark-baseline.json")
+# Problems faster than this are too noisy to flag individually
+MIN_FLAGGED_SECONDS = 0.005
+
+def run_phases(tracer, problem):
+    """Trace a problem once, returning the seconds spent per phase and the serialized trace"""
+    clear_relationship_cache()
+    tracer.reset()
+    code = problem['template'] if 'template' in problem else problem['solution']
+    # Traced code may mutate its inputs, every run gets a fresh copy
+    inputs = copy.deepcopy(problem.get('inputs', {}))
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        transformed_ast = tracer.run_code(
+            code, problem['entrypoint'], problem.get('special_inputs'), problem.get('manualRelationships'), **inputs)
+        executed = time.perf_counter()
+        trace_data = tracer.get_trace_data(transformed_ast)
+        built = time.perf_counter()
+        serialized = json.dumps(trace_data, indent=2)
+        done = time.perf_counter()
+    phases = {
+        'run_code': executed - start,
+        'get_trace_data': built - executed,
+        'serialize': done - built,
+    }
+    return phases, len(tracer.steps), len(serialized.encode('utf-8'))
+
+def benchmark_problem(tracer, problem, repeat, measure_memory=True):
+    """Best-of-`repeat` phase times, plus steps, bytes and peak traced memory from one extra run"""
+    best = None
+    for _ in range(repeat):
+        phases, steps, size = run_phases(tracer, problem)
+        if best is None or sum(phases.values()) < sum(best.values()):
+            best = phases
+    # tracemalloc slows everything down, so memory gets its own run
+    peak = 0
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            run_phases(tracer, problem)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    total = sum(best.values())
+    return {
+        'seconds': total,
+        'phases': best,
+        'steps': steps,
+        'steps_per_second': steps / best['run_code'] if best['run_code'] else 0,
+        'bytes': size,
+        'bytes_per_step': size / steps if steps else 0,
+        'peak_memory_mb': peak / (1024 * 1024),
+    }
+
+def summarize(results):
+    """Totals over the corpus"""
+    steps = sum(result['steps'] for result in results.values())
+    run_code = sum(result['phases']['run_code'] for result in results.values())
+    size = sum(result['bytes'] for result in results.values())
+    return {
+        'seconds': sum(result['seconds'] for result in results.values()),
+        'phases': {
+            phase: sum(result['phases'][phase] for result in results.values())
+            for phase in ('run_code', 'get_trace_data', 'serialize')
+        },
+        'steps': steps,
+        'steps_per_second': steps / run_code if run_code else 0,
+        'bytes_per_step': size / steps if steps else 0,
+        'peak_memory_mb': max((result['peak_memory_mb'] for result in results.values()), default=0),
+    }
+
+def find_regressions(summary, results, baseline, threshold, compare_summary=True):
+    """Describe every metric that got worse than the baseline by more than `threshold`"""
+    regressions = []
+
+    def check(label, current, previous, higher_is_better=False):
+        # Metrics missing on either side (e.g. memory with --no-memory) are not compared
+        if not previous or not current:
+            return
+        change = (previous - current) / previous if higher_is_better else (current - previous) / previous
+        if change > threshold:
+            regressions.append(f"{label}: {previous:.4g} -> {current:.4g} ({change:+.0%})")
+
+    # Totals are only comparable when the same set of problems ran
+    if compare_summary:
+        base_summary = baseline['summary']
+        check("total seconds", summary['seconds'], base_summary['seconds'])
+        for phase, seconds in summary['phases'].items():
+            check(f"{phase} seconds", seconds, base_summary['phases'].get(phase))
+        check("steps/sec", summary['steps_per_second'], base_summary['steps_per_second'], higher_is_better=True)
+        check("bytes/step", summary['bytes_per_step'], base_summary['bytes_per_step'])
+        check("peak memory MB", summary['peak_memory_mb'], base_summary['peak_memory_mb'])
+
+    for problem_id, result in results.items():
+        previous = baseline['problems'].get(problem_id)
+        if previous is None or max(previous['seconds'], result['seconds']) < MIN_FLAGGED_SECONDS:
+            continue
+        check(f"{problem_id} seconds", result['seconds'], previous['seconds'])
+        check(f"{problem_id} peak memory MB", result['peak_memory_mb'], previous['peak_memory_mb'])
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark PythonTracer over all problems and lessons.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per problem, the best is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest problems to list')
+    parser.add_argument('--problem', action='append', metavar='ID', help='Only benchmark the problem with this id (repeatable)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run that measures peak memory (much faster)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    problems = load_problems()
+    if args.problem:
+        problems = [problem for problem in problems if problem['id'] in args.problem]
+
+    tracer = PythonTracer(is_server=True)
+    results = {}
+    for problem in problems:
+        results[problem['id']] = benchmark_problem(tracer, problem, args.repeat, not args.no_memory)
+    summary = summarize(results)
+
+    print(f"{'Problem':<40} {'Steps':>7} {'Steps/s':>9} {'run_code':>9} {'trace':>9} {'json':>9} {'B/step':>7} {'Peak MB':>8}")
+    slowest = sorted(results.items(), key=lambda item: item[1]['seconds'], reverse=True)[:args.top]
+    for problem_id, result in slowest:
+        phases = result['phases']
+        print(
+            f"{problem_id:<40} {result['steps']:>7} {result['steps_per_second']:>9.0f} "
+            f"{phases['run_code'] * 1000:>7.1f}ms {phases['get_trace_data'] * 1000:>7.1f}ms "
+            f"{phases['serialize'] * 1000:>7.1f}ms {result['bytes_per_step']:>7.0f} {result['peak_memory_mb']:>8.1f}"
+        )
+    phases = summary['phases']
+    print(
+        f"\nTotal over {len(results)} problems: {summary['seconds']:.2f}s "
+        f"(run_code {phases['run_code']:.2f}s, get_trace_data {phases['get_trace_data']:.2f}s, "
+        f"serialize {phases['serialize']:.2f}s), {summary['steps']} steps, "
+        f"{summary['steps_per_second']:.0f} steps/s, {summary['bytes_per_step']:.0f} bytes/step, "
+        f"peak {summary['peak_memory_mb']:.1f} MB"
+    )
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'summary': summary, 'problems': results}, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(summary, results, baseline, args.threshold, compare_summary=not args.problem)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions beyond {args.threshold:.0%} against {args.baseline}:")
+            for regression in regressions:
+                print(f"  • {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    else:
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to create one")
@@ -0,0 +1,105 @@
+"""
+Package the browser tracer modules as precompiled bytecode in a single zip archive.
+
+usePyodide adds the archive to sys.path and imports tracer_api from it, so Pyodide does not have
+to compile the module sources on every page load. The bytecode only loads on the Python version
+it was compiled with, which must match the one bundled with Pyodide.
+"""
+
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import tempfile
+import subprocess
+import py_compile
+import statistics
+
+TRACER_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules loaded by usePyodide, in dependency order
+BUNDLE_MODULES = ["utils", "ast_transformer", "relationship_analyzer", "python_tracer", "trace_codec", "tracer_api"]
+# Python version of the Pyodide release loaded by usePyodide
+PYODIDE_PYTHON = (3, 11)
+DEFAULT_OUTPUT = os.path.abspath(os.path.join(TRACER_DIR, "..", "..", "public", "tracer-bundle.zip"))
+
+def build_bundle(output_path):
+    """Compile the tracer modules and write them to a zip archive, returning its size in bytes"""
+    with tempfile.TemporaryDirectory() as build_dir, \
+            zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for module in BUNDLE_MODULES:
+            pyc_path = os.path.join(build_dir, f"{module}.pyc")
+            # Unchecked hash based bytecode loads without the source next to it
+            py_compile.compile(
+                os.path.join(TRACER_DIR, f"{module}.py"),
+                cfile=pyc_path,
+                dfile=f"{module}.py",
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+            bundle.write(pyc_path, f"{module}.pyc")
+        bundle.writestr("bundle.json", json.dumps({
+            'python': list(sys.version_info[:2]),
+            'modules': BUNDLE_MODULES,
+        }))
+    return os.path.getsize(output_path)
+
+# Startup code run in a fresh interpreter for each measurement, printing seconds spent
+_SOURCE_STARTUP = """
+import sys, time, types
+sources = {}
+for name in %(modules)r:
+    with open(%(tracer_dir)r + '/' + name + '.py') as f:
+        sources[name] = f.read()
+start = time.perf_counter()
+# The same registration usePyodide falls back to without a bundle
+for name, code in sources.items():
+    module = types.ModuleType(name)
+    sys.modules[name] = module
+    exec(compile(code, name + '.py', 'exec'), module.__dict__)
+print(time.perf_counter() - start)
+"""
+
+_BUNDLE_STARTUP = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, %(bundle)r)
+import tracer_api
+print(time.perf_counter() - start)
+"""
+
+def measure_startup(bundle_path, repeat):
+    """Median seconds to load the tracer from sources and from the bundle, each in a fresh interpreter"""
+    def median_of(script):
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, '-c', script], check=True, capture_output=True, text=True,
+                cwd=tempfile.gettempdir())  # Keep the tracer directory off sys.path
+            times.append(float(output.stdout.split()[-1]))
+        return statistics.median(times)
+
+    arguments = {'modules': BUNDLE_MODULES, 'tracer_dir': TRACER_DIR, 'bundle': bundle_path}
+    return median_of(_SOURCE_STARTUP % arguments), median_of(_BUNDLE_STARTUP % arguments)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the precompiled tracer bundle loaded by Pyodide.')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Path of the zip archive to write')
+    parser.add_argument('--measure', action='store_true', help='Compare tracer startup from sources and from the bundle')
+    parser.add_argument('--repeat', type=int, default=10, help='Fresh interpreters per measurement, the median is reported')
+    args = parser.parse_args()
+
+    if sys.version_info[:2] != PYODIDE_PYTHON:
+        version = '.'.join(map(str, PYODIDE_PYTHON))
+        print(f"The bundle must be built with Python {version} to match Pyodide, not {sys.version.split()[0]}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    size = build_bundle(args.output)
+    print(f"Wrote {len(BUNDLE_MODULES)} modules to {args.output} ({size / 1024:.1f} KB) in {time.perf_counter() - start:.2f}s")
+
+    if args.measure:
+        from_source, from_bundle = measure_startup(args.output, args.repeat)
+        print(f"Tracer startup (median of {args.repeat}): sources {from_source * 1000:.1f} ms, "
+              f"bundle {from_bundle * 1000:.1f} ms ({from_source / from_bundle:.1f}x faster)")
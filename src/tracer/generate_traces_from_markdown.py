@@ -2,11 +2,16 @@ import os
 import re
 import sys
 import json
-import shutil
+import io
+import argparse
+import hashlib
+import contextlib
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 # Import PythonTracer from the project
 from python_tracer import PythonTracer
+from trace_build import tracer_version, load_manifest, write_manifest
 
 # Regex to match code blocks with python trace-id=...
 CODE_BLOCK_REGEX = re.compile(
@@ -17,8 +22,7 @@ CODE_BLOCK_REGEX = re.compile(
 # Directory to scan for markdown files
 BLOG_DIR = Path(__file__).parent.parent / "data" / "blog"
 TRACES_DIR = Path(__file__).parent.parent / "data" / "blog_traces"
-shutil.rmtree(TRACES_DIR, ignore_errors=True)
-TRACES_DIR.mkdir(exist_ok=True)
+MANIFEST_PATH = Path(__file__).parent.parent / "data" / "blog-trace-manifest.json"
 
 def find_markdown_files(root_dir):
     """Recursively find all .md and .markdown files under root_dir"""
@@ -37,37 +41,120 @@ def extract_code_blocks(filepath):
         code = match.group(2)
         yield (trace_id, code, blog_slug, filepath)
 
+def block_hash(code, version):
+    """Hash of everything that goes into a code block's trace"""
+    return hashlib.sha256(f"{version}\n{code}".encode('utf-8')).hexdigest()[:16]
+
 def write_blog_traces_ts(trace_keys):
+    """Write the static trace mapping, leaving the file alone if its content would not change"""
     output_path = TRACES_DIR / "index.ts"
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write('/* eslint-disable @typescript-eslint/no-require-imports */')
-        f.write('// AUTO-GENERATED FILE. DO NOT EDIT MANUALLY.\n')
-        f.write('export const BLOG_TRACES = {\n')
-        for trace_name in sorted(trace_keys):
-            f.write(f'  "{trace_name}": require("@/data/blog_traces/{trace_name}.json"),\n')
-        f.write('};\n')
+    content = '/* eslint-disable @typescript-eslint/no-require-imports */'
+    content += '// AUTO-GENERATED FILE. DO NOT EDIT MANUALLY.\n'
+    content += 'export const BLOG_TRACES = {\n'
+    for trace_name in sorted(trace_keys):
+        content += f'  "{trace_name}": require("@/data/blog_traces/{trace_name}.json"),\n'
+    content += '};\n'
+    # Rewriting an unchanged index would needlessly trigger a rebuild of everything importing it
+    if output_path.exists() and output_path.read_text(encoding='utf-8') == content:
+        return
+    output_path.write_text(content, encoding='utf-8')
     print(f"Wrote static trace mapping to {output_path}")
 
+def trace_block(tracer, code):
+    """Trace a code block, returning its trace data, error and output log"""
+    tracer.reset()  # Reset tracer state for each block
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            tree = tracer.run_code(code, entrypoint=None, special_inputs=None)
+            trace_data = tracer.get_trace_data(tree)
+            error = None
+        except Exception as e:
+            trace_data, error = None, str(e)
+    return trace_data, error, log.getvalue()
+
+# Each worker process traces with its own tracer
+_worker_tracer = None
+
+def _init_worker():
+    """Create the worker's tracer and point the builtins markers at it"""
+    global _worker_tracer
+    _worker_tracer = PythonTracer()
+    # A forked worker inherits markers bound to the parent's tracer
+    _worker_tracer._install_marker_functions(replace=True)
+
+def _trace_in_worker(code):
+    """Trace one code block in a pool worker"""
+    return trace_block(_worker_tracer, code)
+
+def trace_blocks(codes, workers=1):
+    """Yield (trace_data, error, log) for each code block in order, tracing in a process pool when workers > 1"""
+    if workers <= 1 or len(codes) <= 1:
+        tracer = PythonTracer()
+        for code in codes:
+            yield trace_block(tracer, code)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(codes)), initializer=_init_worker) as executor:
+        yield from executor.map(_trace_in_worker, codes)
+
 def main():
+    parser = argparse.ArgumentParser(description='Generate execution traces for the trace-id code blocks of the blog.')
+    parser.add_argument('--workers', type=int, default=1, help='Trace blocks in this many processes, 0 uses every available core')
+    parser.add_argument('--force', action='store_true', help='Rebuild traces even if the manifest says they are up to date')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    TRACES_DIR.mkdir(exist_ok=True)
+
     seen_trace_ids = {}
-    count = 0
-    tracer = PythonTracer()
+    blocks = {}
     for md_file in find_markdown_files(BLOG_DIR):
         for trace_id, code, blog_slug, filepath in extract_code_blocks(md_file):
-            tracer.reset()  # Reset tracer state for each problem
             trace_name = trace_id
             if trace_name in seen_trace_ids:
                 raise ValueError(f"Duplicate trace name '{trace_name}' found in both {seen_trace_ids[trace_name]} and {filepath}")
             seen_trace_ids[trace_name] = filepath
-            print(f"Generating trace for {trace_name} from {filepath}...")
-            tree = tracer.run_code(code, entrypoint=None, special_inputs=None, problem_key=0)
-            trace_data = tracer.get_trace_data(tree)
-            out_path = TRACES_DIR / f"{trace_name}.json"
-            with open(out_path, 'w', encoding='utf-8') as f:
-                json.dump(trace_data, f, indent=2)
-            count += 1
-    print(f"\nGenerated {count} trace(s) in {TRACES_DIR}/")
+            blocks[trace_name] = code
+
+    # Only trace blocks whose code or tracer changed since their trace was built
+    manifest = load_manifest(MANIFEST_PATH)
+    version = tracer_version()
+    hashes = {trace_name: block_hash(code, version) for trace_name, code in blocks.items()}
+    stale = [
+        trace_name for trace_name in blocks
+        if args.force
+        or manifest.get(trace_name) != hashes[trace_name]
+        or not (TRACES_DIR / f"{trace_name}.json").exists()
+    ]
+    print(f"{len(blocks) - len(stale)} traces up to date, {len(stale)} to build")
+
+    errors = []
+    results = trace_blocks([blocks[trace_name] for trace_name in stale], workers)
+    for trace_name, (trace_data, error, log) in zip(stale, results):
+        print(f"Generating trace for {trace_name} from {seen_trace_ids[trace_name]}...")
+        print(log, end='')
+        if error is not None:
+            print(f"Error tracing {trace_name}: {error}")
+            errors.append(trace_name)
+            manifest.pop(trace_name, None)
+            continue
+        out_path = TRACES_DIR / f"{trace_name}.json"
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(trace_data, f, indent=2)
+        manifest[trace_name] = hashes[trace_name]
+
+    # Drop traces of blocks that were removed or renamed
+    for path in TRACES_DIR.glob("*.json"):
+        if path.stem not in blocks:
+            path.unlink()
+            print(f"Removed stale trace {path.name}")
+    manifest = {trace_name: value for trace_name, value in manifest.items() if trace_name in blocks}
+    write_manifest(MANIFEST_PATH, manifest)
+
+    print(f"\nGenerated {len(stale) - len(errors)} trace(s) in {TRACES_DIR}/")
     write_blog_traces_ts(seen_trace_ids.keys())
+    if errors:
+        print(f"Failed to generate {len(errors)} traces: {', '.join(errors)}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,157 @@
+"""
+Incremental JSON reader that yields parse events instead of building the document.
+
+Memory use is bounded by the read buffer and the nesting depth, and nesting is tracked
+with an explicit stack, so deep documents do not hit the recursion limit.
+
+Events are (prefix, event, value) tuples, where prefix is the dotted path of the
+current container ('item' for array elements) and event is one of
+start_map, map_key, end_map, start_array, end_array or value.
+"""
+
+import re
+from json import JSONDecodeError
+from json.decoder import scanstring
+
+NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+LITERALS = {
+    'true': True,
+    'false': False,
+    'null': None,
+    'NaN': float('nan'),
+    'Infinity': float('inf'),
+    '-Infinity': float('-inf'),
+}
+WHITESPACE = ' \t\n\r'
+
+
+class _Buffer:
+    """Sliding window over a text file"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, dropping what has been consumed. Returns False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        """Advance to the next significant character, returning it or None at end of file"""
+        while True:
+            text = self.text
+            pos = self.pos
+            while pos < len(text) and text[pos] in WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self.fill():
+                return None
+
+    def read_string(self):
+        """Read the string starting at the current quote"""
+        while True:
+            try:
+                value, end = scanstring(self.text, self.pos + 1)
+            except JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            self.pos = end
+            return value
+
+    def read_scalar(self):
+        """Read a number or literal starting at the current position"""
+        # Make sure a literal is never split across chunks
+        while len(self.text) - self.pos < 16 and self.fill():
+            pass
+        while True:
+            match = NUMBER_RE.match(self.text, self.pos)
+            literal = None
+            if match is None or self.text.startswith('-Infinity', self.pos):
+                literal = next((name for name in LITERALS if self.text.startswith(name, self.pos)), None)
+            end = self.pos + len(literal) if literal else (match.end() if match else self.pos)
+            # A token running into the end of the buffer may continue in the next chunk
+            if end >= len(self.text) and self.fill():
+                continue
+            if literal:
+                self.pos = end
+                return LITERALS[literal]
+            if match is None:
+                raise JSONDecodeError("Expecting value", self.text, self.pos)
+            self.pos = end
+            if match.group(1) or match.group(2):
+                return float(match.group(0))
+            return int(match.group(0))
+
+
+def iter_events(f, chunk_size=1 << 16):
+    """Yield (prefix, event, value) for the JSON document in text file f"""
+    buffer = _Buffer(f, chunk_size)
+    path = []  # Key or 'item' for every open container
+    containers = []  # 'map' or 'array' for every open container
+    expect_key = False
+
+    while True:
+        char = buffer.skip_whitespace()
+        if char is None:
+            if containers:
+                raise JSONDecodeError("Unexpected end of document", buffer.text, buffer.pos)
+            return
+
+        if char in ',:':
+            buffer.pos += 1
+            # A comma inside a map is followed by a key
+            expect_key = char == ',' and containers[-1] == 'map'
+            continue
+
+        if char in '}]':
+            buffer.pos += 1
+            kind = containers.pop()
+            path.pop()
+            yield '.'.join(path), 'end_map' if kind == 'map' else 'end_array', None
+            expect_key = False
+            if not containers:
+                return
+            continue
+
+        if expect_key:
+            if char != '"':
+                raise JSONDecodeError("Expecting property name", buffer.text, buffer.pos)
+            key = buffer.read_string()
+            path[-1] = key
+            yield '.'.join(path[:-1]), 'map_key', key
+            expect_key = False
+            continue
+
+        prefix = '.'.join(path)
+        if char == '{':
+            buffer.pos += 1
+            yield prefix, 'start_map', None
+            containers.append('map')
+            path.append(None)
+            expect_key = True
+        elif char == '[':
+            buffer.pos += 1
+            yield prefix, 'start_array', None
+            containers.append('array')
+            path.append('item')
+        elif char == '"':
+            yield prefix, 'value', buffer.read_string()
+        else:
+            yield prefix, 'value', buffer.read_scalar()
+
+        if not containers:
+            return
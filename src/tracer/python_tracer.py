@@ -1,17 +1,118 @@
 import sys
-import json
 import ast
-import builtins
 import copy
+import json
+import builtins
 import io
+import time
 
 from ast_transformer import ASTTransformer, BEFORE_STATEMENT_MARKER, AFTER_STATEMENT_MARKER, BEFORE_EXPRESSION_MARKER, AFTER_EXPRESSION_MARKER
 from relationship_analyzer import RelationshipAnalyzer
 from utils import serialize_value, calculate_delta, TreeNode, Node, ListNode, adjlist_to_graph, list_to_binary_tree, list_to_linked_list, is_collection
 
+class LineGrouper:
+    """Groups recorded steps into line entries, completing each entry as soon as the next line starts"""
+    def __init__(self, get_node):
+        self.get_node = get_node
+        self.entries = []
+        self.current_line = None
+        self.current_steps = []
+        self.line_locals = {}
+        self.prev_locals = {}  # Track previous locals for delta calculation
+        self.var_table = {}
+        self.object_table = {}
+
+    def _create_trace_entry(self):
+        # Calculate delta from previous locals
+        delta = calculate_delta(self.prev_locals, self.line_locals)
+
+        processed_steps = []
+        for s in self.current_steps:
+            filtered = dict(s)
+            if filtered.get("locals") == self.line_locals:
+                filtered.pop("locals")
+            if filtered.get("object_table") == self.object_table:
+                filtered.pop("object_table")
+            if filtered.get("var_table") == self.var_table:
+                filtered.pop("var_table")
+            processed_steps.append(filtered)
+
+        return {
+            "line_number": self.current_line,
+            "locals": self.line_locals,
+            "delta": delta,
+            "object_table": self.object_table,
+            "var_table": self.var_table,
+            "steps": processed_steps
+        }
+
+    def add(self, step):
+        """Add the next step, returning the number of entries completed by it (0 or 1)"""
+        node = self.get_node(step["node_id"])
+        if node is None:
+            print(f"Warning: No node found for ID {step['node_id']}")
+            return 0
+
+        line = node.lineno
+
+        # Start a new line entry if:
+        # 1. Line number changed, or
+        # 2. We're starting a new statement execution (before_statement event)
+        should_start_new_line = (
+            self.current_line != line or
+            step["event"] == "before_statement"
+        )
+
+        completed = 0
+        if should_start_new_line:
+            if self.current_steps:
+                self.entries.append(self._create_trace_entry())
+                completed = 1
+            self.current_line = line
+            self.current_steps = []
+            self.prev_locals = self.line_locals.copy()  # Save previous line's locals
+            self.line_locals = step["locals"]
+            self.object_table = step["object_table"]
+            self.var_table = step["var_table"]
+        self.current_steps.append(step)
+        return completed
+
+    def finish(self, final_locals):
+        """Complete the last entry and return all entries"""
+        if self.current_steps:
+            self.entries.append(self._create_trace_entry())
+            self.current_steps = []
+
+        # Edge case if the last step is an assignment, we need another line to display the delta
+        if self.entries and final_locals:
+            last_entry = self.entries[-1]
+            # If the last entry's locals do not match the final locals, append a synthetic entry
+            if last_entry["locals"] != final_locals:
+                self.entries.append({
+                    "line_number": last_entry["line_number"],
+                    "locals": final_locals,
+                    "object_table": self.object_table,
+                    "var_table": self.var_table,
+                    "delta": calculate_delta(last_entry["locals"], final_locals),
+                    "steps": [last_entry["steps"][0]]
+                })
+        return self.entries
+
 class PythonTracer:
     """Tracer that tracks execution of all statements and expressions"""
-    def __init__(self, is_server: bool = False):
+    def __init__(self, is_server: bool = False, incremental: bool = False, profile: bool = False, counting: bool = False,
+                 stream=None, stream_batch_size: int = 50):
+        # The transformer outlives reset() so that incremental mode can reuse unchanged definitions
+        self.transformer = ASTTransformer(incremental=incremental)
+        # Collect phase timings and counters into metadata['profile']
+        self.profile = profile
+        # Only count executions per node instead of recording steps
+        self.counting = counting
+        # Called with the AST and relationships up front, then with batches of completed line entries
+        if stream and counting:
+            raise ValueError("counting mode records no line entries to stream")
+        self.stream = stream
+        self.stream_batch_size = stream_batch_size
         self.reset()
         self._is_server = is_server
         self._install_marker_functions()
@@ -20,18 +121,42 @@ class PythonTracer:
         """Reset the tracer's state"""
         self.steps = []
         self.step_id = 0
+        self.execution_counts = []  # Indexed by node_id in counting mode
         self.source_code = None
-        self.transformer = ASTTransformer()
+        self.transformer.reset()
         self.relationship_analyzer = RelationshipAnalyzer()
         self.entrypoint = None
         self.inputs = {}
         self.result = None
+        self.error = None  # Exception raised by the traced code in server mode
         self.captured_output = ""
         self.stdout_buffer = None
         self.previous_stdout_length = 0
+        self.phase_times = {}
+        self.counters = {}
+        # Steps are grouped into line entries while recording only when streaming
+        self.grouper = LineGrouper(self.transformer.get_node) if self.stream and not self.counting else None
+        self._entries_sent = 0
+        self._streamed_ast = None
+        self._streamed_relationships = None
+
+    def _add_time(self, phase, seconds):
+        """Accumulate time spent in a phase"""
+        self.phase_times[phase] = self.phase_times.get(phase, 0) + seconds
+
+    def _count(self, counter, amount=1):
+        """Increment a profiling counter"""
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def get_profile(self):
+        """Phase timings in seconds and counters collected while profiling"""
+        return {
+            'phases': {phase: round(seconds, 6) for phase, seconds in self.phase_times.items()},
+            'counters': dict(self.counters),
+        }
 
-    def _install_marker_functions(self):
-        """Make marker functions available in builtin scope"""
+    def _install_marker_functions(self, replace: bool = False):
+        """Make marker functions available in builtin scope, optionally taking over from another tracer"""
         marker_functions = {
             BEFORE_STATEMENT_MARKER: self._thonny_hidden_before_stmt,
             AFTER_STATEMENT_MARKER: self._thonny_hidden_after_stmt,
@@ -40,14 +165,13 @@ class PythonTracer:
         }
         
         for name, func in marker_functions.items():
-            if not hasattr(builtins, name):
+            if replace or not hasattr(builtins, name):
                 setattr(builtins, name, func)
                 
-    def _record_step(self, frame, event, value=None, node=None):
+    def _record_step(self, frame, event, node_id, node, value=None):
         """Record a step in the execution"""
         if node is None or not hasattr(node, "lineno"):
             return
-        node_id = self.transformer.get_node_id(node)
                     
         local_vars = {}
         if frame is not None:
@@ -61,11 +185,15 @@ class PythonTracer:
                 for name, val in frame.f_locals.items()
                 if not name.startswith('_') and not callable(val)
             }
+            start = time.perf_counter() if self.profile else 0
             object_table = self._build_object_table({
                 name: val
                 for name, val in frame.f_locals.items()
                 if not name.startswith('_') and not callable(val)
             })
+            if self.profile:
+                self._add_time('object_table', time.perf_counter() - start)
+                self._count('objects_visited', len(object_table))
         else:
             object_table = {}
             var_table = {}
@@ -100,36 +228,82 @@ class PythonTracer:
         
         self.step_id += 1
         self.steps.append(step)
+        if self.grouper is not None and self.grouper.add(step):
+            if len(self.grouper.entries) - self._entries_sent >= self.stream_batch_size:
+                self._stream_entries(self.grouper.entries[self._entries_sent:])
+
+    def _stream_entries(self, entries):
+        """Send completed line entries to the stream callback"""
+        if entries:
+            self.stream({'type': 'entries', 'start': self._entries_sent, 'entries': entries})
+            self._entries_sent += len(entries)
+
+    def _stream_start(self):
+        """Send the AST and relationships to the stream callback before the code runs"""
+        original_ast = self.transformer.original_ast
+        start = time.perf_counter()
+        self._streamed_relationships = self.relationship_analyzer.analyze_ast(
+            original_ast, self.transformer, self.manual_relationships, source=self.source_code)
+        self._add_time('relationships', time.perf_counter() - start)
+        self._streamed_ast = self.transformer.ast_to_dict(original_ast, self.source_code)
+        self.stream({'type': 'start', 'ast': self._streamed_ast, 'relationships': self._streamed_relationships})
+
+    def _stream_end(self, trace_data):
+        """Send everything but the AST, relationships and trace to the stream callback"""
+        self.stream({
+            'type': 'end',
+            'metadata': trace_data['metadata'],
+            'result': trace_data['result'],
+            'entry_count': len(trace_data['trace']),
+        })
 
     def _thonny_hidden_before_stmt(self, node_id):
         """Marker function called before statements"""
+        if self.counting:
+            self.execution_counts[node_id] += 1
+            return node_id
+        if self.profile:
+            self._count('markers_fired')
         node = self.transformer.get_node(node_id)
         if node is None:
             return node_id
         frame = sys._getframe(1)
-        self._record_step(frame, "before_statement", node=node)
+        self._record_step(frame, "before_statement", node_id, node)
         return node_id
         
     def _thonny_hidden_after_stmt(self, node_id):
         """Marker function called after statements"""
+        if self.counting:
+            return node_id
+        if self.profile:
+            self._count('markers_fired')
         node = self.transformer.get_node(node_id)
         if node is None:
             return node_id
         frame = sys._getframe(1)
-        self._record_step(frame, "after_statement", node=node)
+        self._record_step(frame, "after_statement", node_id, node)
         return node_id
         
     def _thonny_hidden_before_expr(self, node_id):
         """Marker function called before expressions"""
+        if self.counting:
+            self.execution_counts[node_id] += 1
+            return node_id
+        if self.profile:
+            self._count('markers_fired')
         node = self.transformer.get_node(node_id)
         if node is None:
             return node_id
         frame = sys._getframe(1)
-        self._record_step(frame, "before_expression", node=node)
+        self._record_step(frame, "before_expression", node_id, node)
         return node_id
         
     def _thonny_hidden_after_expr(self, node_id, value):
         """Marker function called after expressions with their values"""
+        if self.counting:
+            return value
+        if self.profile:
+            self._count('markers_fired')
         node = self.transformer.get_node(node_id)
         if node is None:
             return value
@@ -140,7 +314,7 @@ class PythonTracer:
         if callable(value):
             return value
         frame = sys._getframe(1)
-        self._record_step(frame, "after_expression", value=value, node=node)
+        self._record_step(frame, "after_expression", node_id, node, value=value)
         return value
     
     def transform_inputs(self, kwargs, special_inputs):
@@ -163,7 +337,7 @@ class PythonTracer:
                     del transformed_kwargs[key]
         return transformed_kwargs
 
-    def run_code(self, code: str, entrypoint: str, special_inputs: list | None, problem_key: int, manual_relationships: list | None = None, **kwargs):
+    def run_code(self, code: str, entrypoint: str, special_inputs: list | None, manual_relationships: list | None = None, **kwargs):
         """Run code with expression tracking and stdout capture"""
         self.source_code = code
         self.entrypoint = entrypoint
@@ -177,7 +351,13 @@ class PythonTracer:
         # Wrap all user code within a try, so we dont fail
         try:
             # Transform the AST for execution
-            tree = self.transformer.transform(code, problem_key)
+            start = time.perf_counter()
+            tree = self.transformer.transform(code)
+            self._add_time('transform', time.perf_counter() - start)
+            if self.counting:
+                self.execution_counts = [0] * self.transformer.node_count()
+            elif self.stream:
+                self._stream_start()
 
             # Transform inputs - convert special input formats to appropriate objects
             transformed_kwargs = self.transform_inputs(kwargs, special_inputs)
@@ -197,19 +377,31 @@ class PythonTracer:
             # Redirect stdout
             sys.stdout = captured_output
             
+            start = time.perf_counter()
             compiled = compile(tree, '<string>', 'exec')
-            exec(compiled, namespace)
+            self._add_time('compile', time.perf_counter() - start)
             
-            # If entrypoint is specified, call the function with transformed kwargs
-            if entrypoint and entrypoint in namespace:
-                self.result = namespace[entrypoint](**transformed_kwargs)
+            # Execution includes the markers and the object tables they build
+            start = time.perf_counter()
+            try:
+                exec(compiled, namespace)
+                
+                # If entrypoint is specified, call the function with transformed kwargs
+                if entrypoint and entrypoint in namespace:
+                    self.result = namespace[entrypoint](**transformed_kwargs)
+            finally:
+                self._add_time('execute', time.perf_counter() - start)
         except Exception as e:
             # Do not allow clients to swallow errors. We allow for server to generate templates
             if not self._is_server:
                 raise e
             # if there is an error, we don't generate a trace
             print(f"Error executing code: {e}")
+            self.error = e
             self.steps = []
+            if self.grouper is not None:
+                # Entries streamed so far are dropped, the end message reports an empty trace
+                self.grouper = LineGrouper(self.transformer.get_node)
         finally:
             # Always restore original stdout
             sys.stdout = original_stdout
@@ -220,21 +412,21 @@ class PythonTracer:
         
         return tree
 
-    def save_results(self, filename: str, transformed_ast):
+    def save_results(self, filename: str, transformed_ast, compact_ast: bool = False):
         """Save results to a JSON file with steps grouped by line number"""
         # Get the trace data using the existing method
-        trace_data = self.get_trace_data(transformed_ast)
+        trace_data = self.get_trace_data(transformed_ast, compact_ast)
         
         # Save to file
         with open(filename, 'w') as f:
             json.dump(trace_data, f, indent=2)
 
-    def get_trace_data(self, transformed_ast):
-        """Get trace data as a dictionary without saving to file"""
+    def get_trace_data(self, transformed_ast, compact_ast: bool = False):
+        """Get trace data as a dictionary without saving to file, optionally with the AST as flat arrays"""
         print(f"Total steps recorded: {len(self.steps)}")
 
         if transformed_ast is None:
-            return {
+            trace_data = {
                 'metadata': {
                     'code': self.source_code,
                     'function': getattr(self, 'entrypoint', None),
@@ -248,98 +440,56 @@ class PythonTracer:
                 'relationships': [],
                 'trace': [],
                 'result': serialize_value(self.result),
-            } 
+            }
+            if self.profile:
+                trace_data['metadata']['profile'] = self.get_profile()
+            if self.stream and not self.counting:
+                self._stream_end(trace_data)
+            return trace_data
+
+        if self.counting:
+            return self._get_count_data(compact_ast)
 
-        # Unwrap the transformed AST back to original structure while preserving node IDs
-        unwrapped_ast = self.transformer.unwrap_transformed_ast(transformed_ast)
-        # Analyze relationships from the unwrapped AST (clean structure with node IDs)
-        relationships = self.relationship_analyzer.analyze_ast(unwrapped_ast, self.transformer, self.manual_relationships)
+        # The transformer keeps an untransformed copy of the AST that shares node IDs with the executed one
+        original_ast = self.transformer.original_ast
+        # Analyze relationships from the original AST (clean structure with node IDs), unless they were streamed
+        relationships = self._streamed_relationships
+        if relationships is None:
+            start = time.perf_counter()
+            relationships = self.relationship_analyzer.analyze_ast(
+                original_ast, self.transformer, self.manual_relationships, source=self.source_code)
+            self._add_time('relationships', time.perf_counter() - start)
+        grouping_start = time.perf_counter()
 
         print(f"Found {len(relationships)} relationships")
         
-        trace = []
-        current_line = None
-        current_steps = []
-        line_locals = {}
-        prev_locals = {}  # Track previous locals for delta calculation
-        var_table = {}
-        object_table = {}
-        
-        def _create_trace_entry(line, locals, steps, object_table, var_table):
-            # Calculate delta from previous locals
-            delta = calculate_delta(prev_locals, locals)
-
-            processed_steps = []
-            for s in steps:
-                filtered = dict(s)
-                if filtered.get("locals") == locals:
-                    filtered.pop("locals")
-                if filtered.get("object_table") == object_table:
-                    filtered.pop("object_table")
-                if filtered.get("var_table") == var_table:
-                    filtered.pop("var_table")
-                processed_steps.append(filtered)
-
-            return {
-                "line_number": line,
-                "locals": locals,
-                "delta": delta,
-                "object_table": object_table,
-                "var_table": var_table,
-                "steps": processed_steps
-            }
-            
-        for step in self.steps:
-            node = self.transformer.get_node(step["node_id"])
-            if node is None:
-                print(f"Warning: No node found for ID {step['node_id']}")
-                continue
-                
-            line = node.lineno
-            
-            # Start a new line entry if:
-            # 1. Line number changed, or  
-            # 2. We're starting a new statement execution (before_statement event)
-            should_start_new_line = (
-                current_line != line or 
-                step["event"] == "before_statement"
-            )
-            
-            if should_start_new_line:
-                if current_steps:
-                    trace.append(_create_trace_entry(current_line, line_locals, current_steps, object_table, var_table))
-                current_line = line
-                current_steps = []
-                prev_locals = line_locals.copy()  # Save previous line's locals
-                line_locals = step["locals"]
-                object_table = step["object_table"]
-                var_table = step["var_table"]
-            current_steps.append(step)
-        
-        if current_steps:
-            trace.append(_create_trace_entry(current_line, line_locals, current_steps, object_table, var_table  ))
-
-        # Edge case if the last step is an assignment, we need another line to display the delta
+        # When streaming, steps were grouped as they were recorded
+        grouper = self.grouper
+        if grouper is None:
+            grouper = LineGrouper(self.transformer.get_node)
+            for step in self.steps:
+                grouper.add(step)
         line_locals = self.steps[-1]["locals"] if self.steps and "locals" in self.steps[-1] else {}
-        if trace and line_locals:
-            last_entry = trace[-1]
-            # If the last entry's locals do not match the final locals, append a synthetic entry
-            if last_entry["locals"] != line_locals:
-                trace.append({
-                    "line_number": last_entry["line_number"],
-                    "locals": line_locals,
-                    "object_table": object_table,
-                    "var_table": var_table,
-                    "delta": calculate_delta(last_entry["locals"], line_locals),
-                    "steps": [last_entry["steps"][0]] 
-                })
+        trace = grouper.finish(line_locals)
+        if self.stream:
+            self._stream_entries(trace[self._entries_sent:])
 
         print(f"Generated {len(trace)} trace entries")
+        self._add_time('grouping', time.perf_counter() - grouping_start)
+        self._count('steps_recorded', len(self.steps))
+        self._count('trace_entries', len(trace))
 
-        # Use the unwrapped AST for JSON output (clean structure with node IDs)
-        json_ast = self.transformer.ast_to_dict(unwrapped_ast, self.source_code)
+        # Use the original AST for JSON output (clean structure with node IDs)
+        start = time.perf_counter()
+        if compact_ast:
+            json_ast = self.transformer.ast_to_compact(original_ast)
+        elif self._streamed_ast is not None:
+            json_ast = self._streamed_ast
+        else:
+            json_ast = self.transformer.ast_to_dict(original_ast, self.source_code)
+        self._add_time('ast_serialization', time.perf_counter() - start)
         
-        return {
+        trace_data = {
             'metadata': {
                 'code': self.source_code,
                 'function': getattr(self, 'entrypoint', None),
@@ -353,7 +503,50 @@ class PythonTracer:
             'relationships': relationships,
             'trace': trace,
             'result': serialize_value(self.result),
-        } 
+        }
+        if self.profile:
+            trace_data['metadata']['profile'] = self.get_profile()
+        if self.stream:
+            self._stream_end(trace_data)
+        return trace_data
+
+    def _get_count_data(self, compact_ast: bool = False):
+        """Trace data for counting mode: no steps, only how often each node and line ran"""
+        # A line ran as often as the statement starting on it that ran the most
+        line_counts = {}
+        for node_id, count in enumerate(self.execution_counts):
+            node = self.transformer.get_node(node_id)
+            if count and isinstance(node, ast.stmt):
+                line_counts[node.lineno] = max(line_counts.get(node.lineno, 0), count)
+
+        original_ast = self.transformer.original_ast
+        if compact_ast:
+            json_ast = self.transformer.ast_to_compact(original_ast)
+        else:
+            json_ast = self.transformer.ast_to_dict(original_ast, self.source_code)
+
+        trace_data = {
+            'metadata': {
+                'code': self.source_code,
+                'function': getattr(self, 'entrypoint', None),
+                'inputs': {
+                    'kwargs': {k: repr(v) for k, v in getattr(self, 'inputs', {}).items()}
+                },
+                'stdout': self.captured_output,
+                'finalLocals': {},
+            },
+            'ast': json_ast,
+            'relationships': [],
+            'trace': [],
+            'execution_counts': {
+                'nodes': self.execution_counts,
+                'lines': {str(line): count for line, count in sorted(line_counts.items())},
+            },
+            'result': serialize_value(self.result),
+        }
+        if self.profile:
+            trace_data['metadata']['profile'] = self.get_profile()
+        return trace_data
 
     def _build_object_table(self, variables):
         """
@@ -1,85 +1,168 @@
 import ast
+import json
+import hashlib
+from collections import OrderedDict
+
+# Relationships only depend on the source, so they are cached across traces
+# (and across tracer instances in the same interpreter) with LRU eviction
+RELATIONSHIP_CACHE_SIZE = 256
+_relationship_cache = OrderedDict()
+
+def relationship_cache_key(source, manual_relationships=None):
+    """Hash of the source with line endings and trailing whitespace normalized, plus the manual relationships"""
+    normalized = '\n'.join(line.rstrip() for line in source.splitlines())
+    manual = json.dumps(manual_relationships or [], sort_keys=True)
+    return hashlib.sha256(f"{normalized}\0{manual}".encode('utf-8')).hexdigest()
+
+def clear_relationship_cache():
+    """Forget all cached relationships, e.g. to time the analysis itself"""
+    _relationship_cache.clear()
+
+def _node_anchor(node):
+    """Identify a node by its type and position, independent of node IDs"""
+    return (type(node).__name__, getattr(node, 'lineno', None), getattr(node, 'col_offset', None))
 
 class RelationshipAnalyzer:
     """Analyzes AST to identify relationships between container objects and key-like primitives"""
     
     def __init__(self):
-        self.relationships = []
+        self.relationships = {}  # (container, cursor, type, node_id) -> relationship, in insertion order
+        self._relationship_pairs = set()  # (container, cursor, type) already recorded
         self.variable_types = {}  # Track inferred variable types
+        self.name_usages = {}  # name -> [cursor_usage_count, non_cursor_usage_count]
+        self._cursor_cache = {}  # Memoized _is_cursor_variable results
         self.transformer = None  # Will be set when analyzing
         
     def reset(self):
         """Reset the analyzer's state"""
-        self.relationships = []
+        self.relationships = {}
+        self._relationship_pairs = set()
         self.variable_types = {}
+        self.name_usages = {}
+        self._cursor_cache = {}
         self.transformer = None
         
-    def analyze_ast(self, root, transformer=None, manual_relationships=None):
-        """Analyze the AST to find container-cursor relationships"""
+    def analyze_ast(self, root, transformer=None, manual_relationships=None, source=None):
+        """Analyze the AST to find container-cursor relationships, cached by source when it is given"""
+        if source is None or transformer is None:
+            return self._analyze_ast(root, transformer, manual_relationships)
+            
+        key = relationship_cache_key(source, manual_relationships)
+        cached = _relationship_cache.get(key)
+        if cached is not None and self._anchors_match(cached, transformer):
+            _relationship_cache.move_to_end(key)
+            return [dict(relationship) for relationship, _ in cached]
+            
+        relationships = self._analyze_ast(root, transformer, manual_relationships)
+        _relationship_cache[key] = [
+            (dict(relationship), self._anchor_for(relationship['node_id'], transformer))
+            for relationship in relationships
+        ]
+        _relationship_cache.move_to_end(key)
+        while len(_relationship_cache) > RELATIONSHIP_CACHE_SIZE:
+            _relationship_cache.popitem(last=False)
+        return relationships
+        
+    def _anchor_for(self, node_id, transformer):
+        """Anchor of the node a relationship points at, None for manual relationships"""
+        if node_id < 0:
+            return None
+        return _node_anchor(transformer.get_node(node_id))
+        
+    def _anchors_match(self, cached, transformer):
+        """Check that cached node IDs still point at the same nodes.
+        
+        An incremental transformer keeps the IDs of reused definitions, so the
+        same source can be numbered differently from one transform to the next.
+        """
+        for relationship, anchor in cached:
+            if anchor is None:
+                continue
+            node = transformer.get_node(relationship['node_id'])
+            if node is None or _node_anchor(node) != anchor:
+                return False
+        return True
+        
+    def _analyze_ast(self, root, transformer=None, manual_relationships=None):
+        """Run the relationship analysis without consulting the cache"""
         self.reset()
         self.transformer = transformer
         self._ast_root = root
         
-        # First pass: infer variable types from their usage
-        self._infer_variable_types(root)
-        
-        # Second pass: analyze relationships only for container-cursor pairs
+        # Single walk: infer variable types, count name usages and collect the
+        # nodes that can form relationships. Classification needs the types of
+        # the whole tree, so the candidates are analyzed once the walk is done.
+        candidates = []
         for node in ast.walk(root):
+            self._infer_variable_type(node)
+            if isinstance(node, ast.Name):
+                self._index_name_usage(node)
+            elif isinstance(node, (ast.Subscript, ast.For, ast.Compare)):
+                candidates.append(node)
+        
+        # Analyze relationships only for container-cursor pairs
+        for node in candidates:
             if isinstance(node, ast.Subscript):
                 self._analyze_subscript(node)
             elif isinstance(node, ast.For):
                 self._analyze_for_loop(node)
-            elif isinstance(node, ast.Compare):
+            else:
                 self._analyze_membership_test(node)
         
         # Add manual relationships if provided
         if manual_relationships:
             self._add_manual_relationships(manual_relationships)
                     
-        return self.relationships
+        return list(self.relationships.values())
         
-    def _infer_variable_types(self, root):
-        """Infer variable types from their usage patterns"""
-        for node in ast.walk(root):
-            # Variables assigned to container literals
-            if isinstance(node, ast.Assign):
-                if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
-                    var_name = node.targets[0].id
-                    if isinstance(node.value, (ast.List, ast.Tuple)):
-                        self.variable_types[var_name] = 'list'
-                    elif isinstance(node.value, ast.Dict):
-                        self.variable_types[var_name] = 'dict'
-                    elif isinstance(node.value, ast.Set):
-                        self.variable_types[var_name] = 'set'
-                        
-            # Variables used as containers in subscript operations
-            elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
-                container_name = node.value.id
-                if container_name not in self.variable_types:
-                    # Infer container type from context
-                    self.variable_types[container_name] = 'container'
+    def _infer_variable_type(self, node):
+        """Infer variable types from the usage pattern at a single node"""
+        # Variables assigned to container literals
+        if isinstance(node, ast.Assign):
+            if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                var_name = node.targets[0].id
+                if isinstance(node.value, (ast.List, ast.Tuple)):
+                    self.variable_types[var_name] = 'list'
+                elif isinstance(node.value, ast.Dict):
+                    self.variable_types[var_name] = 'dict'
+                elif isinstance(node.value, ast.Set):
+                    self.variable_types[var_name] = 'set'
                     
-            # Variables used as iterables in for loops
-            elif isinstance(node, ast.For):
-                if isinstance(node.iter, ast.Name):
-                    container_name = node.iter.id
-                    if container_name not in self.variable_types:
-                        self.variable_types[container_name] = 'iterable'
-                elif isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name):
-                    if node.iter.func.id == 'enumerate' and len(node.iter.args) > 0:
-                        if isinstance(node.iter.args[0], ast.Name):
-                            container_name = node.iter.args[0].id
-                            if container_name not in self.variable_types:
-                                self.variable_types[container_name] = 'iterable'
-                                
-            # Variables used in membership tests (in/not in)
-            elif isinstance(node, ast.Compare):
-                if len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn)):
-                    if len(node.comparators) == 1 and isinstance(node.comparators[0], ast.Name):
-                        container_name = node.comparators[0].id
+        # Variables used as containers in subscript operations
+        elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
+            container_name = node.value.id
+            if container_name not in self.variable_types:
+                # Infer container type from context
+                self.variable_types[container_name] = 'container'
+                
+        # Variables used as iterables in for loops
+        elif isinstance(node, ast.For):
+            if isinstance(node.iter, ast.Name):
+                container_name = node.iter.id
+                if container_name not in self.variable_types:
+                    self.variable_types[container_name] = 'iterable'
+            elif isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name):
+                if node.iter.func.id == 'enumerate' and len(node.iter.args) > 0:
+                    if isinstance(node.iter.args[0], ast.Name):
+                        container_name = node.iter.args[0].id
                         if container_name not in self.variable_types:
-                            self.variable_types[container_name] = 'container'
+                            self.variable_types[container_name] = 'iterable'
                             
+        # Variables used in membership tests (in/not in)
+        elif isinstance(node, ast.Compare):
+            if len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn)):
+                if len(node.comparators) == 1 and isinstance(node.comparators[0], ast.Name):
+                    container_name = node.comparators[0].id
+                    if container_name not in self.variable_types:
+                        self.variable_types[container_name] = 'container'
+                        
+    def _index_name_usage(self, node):
+        """Count a Name node as a cursor or non-cursor usage of its variable"""
+        if self._is_cursor_usage_context(node):
+            self.name_usages.setdefault(node.id, [0, 0])[0] += 1
+        elif self._is_non_cursor_usage_context(node):
+            self.name_usages.setdefault(node.id, [0, 0])[1] += 1
+                    
     def _is_container_variable(self, var_name):
         """Check if a variable is likely a container"""
         var_type = self.variable_types.get(var_name)
@@ -87,12 +170,18 @@ class RelationshipAnalyzer:
         
     def _is_cursor_variable(self, var_name):
         """Check if a variable is likely a cursor/key based on AST usage patterns"""
+        if var_name in self._cursor_cache:
+            return self._cursor_cache[var_name]
+            
         # Skip variables that are clearly containers themselves
         if self._is_container_variable(var_name):
-            return False
+            is_cursor = False
+        else:
+            # Use AST analysis to determine if this variable is used as a cursor
+            is_cursor = self._is_used_as_cursor_in_ast(var_name)
             
-        # Use AST analysis to determine if this variable is used as a cursor
-        return self._is_used_as_cursor_in_ast(var_name)
+        self._cursor_cache[var_name] = is_cursor
+        return is_cursor
         
     def _is_used_as_cursor_in_ast(self, var_name):
         """Analyze AST to see if variable is used in cursor-like patterns"""
@@ -100,15 +189,8 @@ class RelationshipAnalyzer:
             # If we don't have the AST, be permissive
             return True
             
-        cursor_usage_count = 0
-        non_cursor_usage_count = 0
-        
-        for node in ast.walk(self._ast_root):
-            if isinstance(node, ast.Name) and node.id == var_name:
-                if self._is_cursor_usage_context(node):
-                    cursor_usage_count += 1
-                elif self._is_non_cursor_usage_context(node):
-                    non_cursor_usage_count += 1
+        # Counts come from the indexing done during the analyze_ast walk
+        cursor_usage_count, non_cursor_usage_count = self.name_usages.get(var_name, (0, 0))
                     
         # If variable is used more as a cursor than not, consider it a cursor
         # Also allow if it's only used as cursor (even if just once)
@@ -378,23 +460,23 @@ class RelationshipAnalyzer:
                 
     def _add_relationship(self, container, cursor, rel_type, node):
         """Add a relationship if it doesn't already exist and has a valid node_id"""
-        # Get the node_id from the node's _tracer_id attribute
-        node_id = getattr(node, '_tracer_id', None)
+        # Get the node_id assigned by the transformer
+        node_id = self.transformer.get_node_id(node) if self.transformer else None
         
         # Only add relationships with valid node IDs
         if node_id is None:
             return
         
-        relationship = {
-            'container': container,
-            'cursor': cursor,
-            'type': rel_type,
-            'node_id': node_id
-        }
-        
         # Avoid duplicates
-        if relationship not in self.relationships:
-            self.relationships.append(relationship)
+        key = (container, cursor, rel_type, node_id)
+        if key not in self.relationships:
+            self.relationships[key] = {
+                'container': container,
+                'cursor': cursor,
+                'type': rel_type,
+                'node_id': node_id
+            }
+            self._relationship_pairs.add(key[:3])
     
     def _add_manual_relationships(self, manual_relationships):
         """Add manually specified relationships"""
@@ -414,11 +496,8 @@ class RelationshipAnalyzer:
                 relationship['description'] = manual_rel['description']
             
             # Avoid duplicates (check by container, cursor, type)
-            existing = [r for r in self.relationships 
-                       if r['container'] == relationship['container'] 
-                       and r['cursor'] == relationship['cursor']
-                       and r['type'] == relationship['type']]
-            
-            if not existing:
-                self.relationships.append(relationship)
+            pair = (relationship['container'], relationship['cursor'], relationship['type'])
+            if pair not in self._relationship_pairs:
+                self.relationships[pair + (fake_node_id,)] = relationship
+                self._relationship_pairs.add(pair)
                 print(f"Added manual relationship: {manual_rel['container']} -> {manual_rel['cursor']} ({manual_rel['type']})") 
\ No newline at end of file
@@ -1,78 +1,35 @@
-import sys
-import json
-import ast
-import builtins
 import os
+import sys
+import argparse
 
-# Import the refactored classes
-from python_tracer import PythonTracer
-from validate_trace import validate_directory
+from trace_build import build_traces
 
 if __name__ == '__main__':
-    PROBLEM_DIR = os.path.abspath(os.path.join(__file__, "..", "..", "data"))
-    OUTPUT_DIR = os.path.abspath(os.path.join(__file__, "..", "..", "data", "traces"))
-    # Let's not delete the output directory for now
-    # if os.path.exists(OUTPUT_DIR):
-    #     for file in os.listdir(OUTPUT_DIR):
-    #         os.remove(os.path.join(OUTPUT_DIR, file))
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    # Load problems from both files
-    all_problems = []
-    
-    # Load main problems
-    try:
-        with open(os.path.join(PROBLEM_DIR, "problems.json"), "r") as f:
-            problems = json.load(f)['problems']
-            all_problems.extend(problems)
-            print(f"Loaded {len(problems)} problems from problems.json")
-    except FileNotFoundError:
-        print("problems.json not found")
-    
-    # Load lesson problems
+    parser = argparse.ArgumentParser(description='Generate execution traces for all problems and lessons.')
+    parser.add_argument('--compact-ast', action='store_true', help='Encode the ast section as flat arrays of type, parent and location')
+    parser.add_argument('--shared-ast', action='store_true', help='Store each distinct AST once in data/asts, keyed by source hash, and reference it from traces. Off by default, few problems share a source')
+    parser.add_argument('--workers', type=int, default=1, help='Trace problems in this many processes, 0 uses every available core')
+    parser.add_argument('--profile', action='store_true', help='Record phase timings and counters in metadata.profile and print the slowest problems')
+    parser.add_argument('--counting', action='store_true', help='Only count how often each node and line ran instead of recording steps')
+    parser.add_argument('--memory-report', action='store_true', help='Trace under tracemalloc in this process and report peak memory and allocation sites per problem')
+    parser.add_argument('--isolate', action='store_true', help='Trace every problem in its own process with CPU time and memory limits')
+    parser.add_argument('--cpu-limit', type=int, default=30, help='CPU seconds per problem with --isolate')
+    parser.add_argument('--memory-limit', type=int, default=1024, help='Address space in MB per problem with --isolate')
+    parser.add_argument('--timeout', type=int, default=120, help='Wall clock seconds per problem with --isolate')
+    parser.add_argument('--problem', action='append', metavar='ID', help='Only build the problem with this id (repeatable)')
+    parser.add_argument('--force', action='store_true', help='Rebuild traces even if the manifest says they are up to date')
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    if args.memory_report and (args.isolate or workers > 1):
+        parser.error("--memory-report traces in this process and cannot be combined with --isolate or --workers")
+
     try:
-        with open(os.path.join(PROBLEM_DIR, "lesson-problems.json"), "r") as f:
-            lesson_problems = json.load(f)
-            all_problems.extend(lesson_problems)
-            print(f"Loaded {len(lesson_problems)} lessons from lesson-problems.json")
-    except FileNotFoundError:
-        print("lesson-problems.json not found")
-    
-    print(f"Total items to process: {len(all_problems)}")
-    
-    tracer = PythonTracer(is_server=True)
-    for problem_key, problem in enumerate(all_problems):
-        print(f"Processing {problem['id']}...")
-        tracer.reset()  # Reset tracer state for each problem
-        transformed_ast = tracer.run_code(
-            # we prioritize rendering the template over the solution
-            problem['template'] if 'template' in problem else problem['solution'], 
-            problem['entrypoint'], 
-            problem.get('special_inputs', None),
-            problem_key,
-            problem.get('manualRelationships', None),
-            **problem['inputs'] if 'inputs' in problem else {}
-        )
-        try:
-            tracer.save_results(os.path.join(OUTPUT_DIR, f"{problem['id']}.json"), transformed_ast)
-        except Exception as e:
-            print(f"Error saving results for {problem['id']}: {e}")
-            continue
-    
-    print("Done generating traces!")
-    
-    # Validate all generated trace files
-    print(f"\n{'='*60}")
-    print("🔍 VALIDATING GENERATED TRACES")
-    print('='*60)
-    
-    success = validate_directory(OUTPUT_DIR)
-    
-    print(f"\n{'='*60}")
-    if success:
-        print("🎉 ALL TRACES GENERATED SUCCESSFULLY AND PASSED VALIDATION!")
-    else:
-        print("❌ SOME TRACES FAILED VALIDATION - CHECK OUTPUT ABOVE")
-    print('='*60) 
\ No newline at end of file
+        results = build_traces(
+            args.problem, args.compact_ast, args.shared_ast, workers, args.profile, args.memory_report,
+            args.isolate, args.cpu_limit, args.memory_limit, args.timeout, args.force, args.counting)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    # Fail the build when a trace could not be generated or did not pass validation
+    if results['failed'] or results['invalid']:
+        sys.exit(1)
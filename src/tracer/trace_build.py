@@ -0,0 +1,527 @@
+"""
+Generation, validation and incremental rebuilding of the problem and lesson traces.
+
+trace.py is the command line for this module. Scripts import build_traces from here rather than
+from trace, whose name is shared with a standard library module.
+"""
+
+import sys
+import json
+import ast
+import os
+import hashlib
+import io
+import time
+import signal
+import contextlib
+import tracemalloc
+import multiprocessing
+import multiprocessing.connection
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Import the refactored classes
+from python_tracer import PythonTracer
+from validate_trace import validate_tree, format_conflict_report
+
+TRACER_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules whose source determines the generated traces
+TRACER_MODULES = ["ast_transformer.py", "python_tracer.py", "relationship_analyzer.py", "utils.py"]
+
+def source_hash(code):
+    """Key for the shared AST store, identical sources produce identical ASTs"""
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()[:16]
+
+def tracer_version():
+    """Hash of the tracer source, so that changing the tracer rebuilds every trace"""
+    digest = hashlib.sha256()
+    for module in TRACER_MODULES:
+        with open(os.path.join(TRACER_DIR, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def problem_hash(problem, version, options):
+    """Hash of everything that goes into a problem's trace"""
+    content = {
+        'code': problem['template'] if 'template' in problem else problem['solution'],
+        'entrypoint': problem['entrypoint'],
+        'inputs': problem.get('inputs', {}),
+        'special_inputs': problem.get('special_inputs'),
+        'manualRelationships': problem.get('manualRelationships'),
+        'tracer': version,
+        'options': options,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=repr).encode('utf-8')).hexdigest()[:16]
+
+def load_manifest(path):
+    """Load the build manifest mapping problem ids to the hash their trace was built from"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def write_manifest(path, manifest):
+    """Write the build manifest"""
+    with open(path, 'w') as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=2)
+        f.write('\n')
+
+def write_shared_asts_ts(ast_dir, keys):
+    """Write the static import map for the shared AST store"""
+    output_path = os.path.join(ast_dir, "index.ts")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('/* eslint-disable @typescript-eslint/no-require-imports */\n')
+        f.write('// AUTO-GENERATED FILE. DO NOT EDIT MANUALLY.\n')
+        f.write('export const SHARED_ASTS: Record<string, unknown> = {\n')
+        for key in sorted(keys):
+            f.write(f'  "{key}": require("@/data/asts/{key}.json"),\n')
+        f.write('};\n')
+    print(f"Wrote shared AST mapping to {output_path}")
+
+def generate_trace(tracer, problem, compact_ast=False):
+    """Run a problem through the tracer and return its code and trace data"""
+    tracer.reset()  # Reset tracer state for each problem
+    # we prioritize rendering the template over the solution
+    code = problem['template'] if 'template' in problem else problem['solution']
+    transformed_ast = tracer.run_code(
+        code, 
+        problem['entrypoint'], 
+        problem.get('special_inputs', None),
+        problem.get('manualRelationships', None),
+        **problem['inputs'] if 'inputs' in problem else {}
+    )
+    trace_data = tracer.get_trace_data(transformed_ast, compact_ast)
+    # Code with statements that ran without errors fires markers, unless they are bound to another tracer
+    recorded = trace_data['execution_counts']['nodes'] if tracer.counting else trace_data['trace']
+    if not any(recorded) and tracer.error is None and transformed_ast is not None and ast.parse(code).body:
+        raise RuntimeError("the code ran but the trace has no entries")
+    return code, trace_data
+
+# Each worker process traces with its own tracer
+_worker_tracer = None
+
+def _init_worker(profile=False, counting=False):
+    """Create the worker's tracer and point the builtins markers at it"""
+    global _worker_tracer
+    _worker_tracer = PythonTracer(is_server=True, profile=profile, counting=counting)
+    # A forked worker inherits markers bound to the parent's tracer
+    _worker_tracer._install_marker_functions(replace=True)
+
+def _generate_logged(tracer, problem, compact_ast):
+    """Trace one problem, returning its output log instead of interleaving prints"""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            code, trace_data = generate_trace(tracer, problem, compact_ast)
+            error = None
+        except Exception as e:
+            code, trace_data, error = None, None, str(e)
+    return code, trace_data, error, log.getvalue()
+
+def _generate_in_worker(problem, compact_ast):
+    """Trace one problem in a pool worker"""
+    return _generate_logged(_worker_tracer, problem, compact_ast)
+
+def _generate_isolated(connection, problem, compact_ast, cpu_limit, memory_limit, profile=False, counting=False):
+    """Trace one problem in its own process under CPU time and address space limits"""
+    import resource
+    if cpu_limit:
+        # SIGXCPU is sent at the soft limit, SIGKILL at the hard one
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+    if memory_limit:
+        limit_bytes = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+
+    tracer = PythonTracer(is_server=True, profile=profile, counting=counting)
+    tracer._install_marker_functions(replace=True)
+    code, trace_data, error, log = _generate_logged(tracer, problem, compact_ast)
+    # Server mode turns errors in the traced code into an empty trace, a MemoryError means the limit was hit
+    memory_exceeded = isinstance(tracer.error, MemoryError)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+    connection.send((code, trace_data, error, log, memory_exceeded, peak_rss_mb))
+    connection.close()
+
+def _isolated_outcome(message, exitcode, timed_out):
+    """Turn what an isolated process sent back (if anything) into a result and a status"""
+    if message is not None:
+        code, trace_data, error, log, memory_exceeded, peak_rss_mb = message
+        if memory_exceeded:
+            return code, None, "memory limit exceeded", log, "memory limit", peak_rss_mb
+        return code, trace_data, error, log, "error" if error else "ok", peak_rss_mb
+    if timed_out:
+        return None, None, "wall clock limit exceeded", "", "timeout", None
+    if exitcode == -signal.SIGXCPU:
+        return None, None, "CPU time limit exceeded", "", "cpu limit", None
+    return None, None, f"process exited with code {exitcode}", "", "crashed", None
+
+def generate_traces_isolated(all_problems, compact_ast=False, workers=1, cpu_limit=30, memory_limit=1024, wall_limit=120, report=None, profile=False, counting=False):
+    """Yield (problem, code, trace_data, error) in problem order, tracing each problem in its own limited process.
+
+    Runs up to `workers` processes at once. The CPU limit stops problems that compute forever, the wall
+    clock limit those that block. One entry per problem with its status, wall time and peak RSS is
+    appended to `report`.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    pending = deque(enumerate(all_problems))
+    running = {}
+    finished = {}
+    next_index = 0
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, problem = pending.popleft()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_generate_isolated,
+                args=(sender, problem, compact_ast, cpu_limit, memory_limit, profile, counting),
+                daemon=True,
+            )
+            process.start()
+            sender.close()
+            running[receiver] = (index, problem, process, time.perf_counter())
+
+        # A connection becomes ready when its process sends a result or dies
+        ready = multiprocessing.connection.wait(list(running), timeout=0.5)
+        now = time.perf_counter()
+        for receiver in list(running):
+            index, problem, process, started = running[receiver]
+            message = None
+            timed_out = False
+            if receiver in ready:
+                try:
+                    message = receiver.recv()
+                except EOFError:
+                    pass  # The process died before sending anything
+            elif wall_limit and now - started > wall_limit:
+                process.kill()
+                timed_out = True
+            else:
+                continue
+            process.join()
+            receiver.close()
+            del running[receiver]
+
+            code, trace_data, error, log, status, peak_rss_mb = _isolated_outcome(message, process.exitcode, timed_out)
+            if report is not None:
+                report.append({
+                    'id': problem['id'],
+                    'status': status,
+                    'seconds': time.perf_counter() - started,
+                    'peak_rss_mb': peak_rss_mb,
+                })
+            finished[index] = (problem, code, trace_data, error, log)
+
+        # Yield in problem order as soon as the next problem is done
+        while next_index in finished:
+            problem, code, trace_data, error, log = finished.pop(next_index)
+            print(f"Processing {problem['id']}...")
+            print(log, end='')
+            yield problem, code, trace_data, error
+            next_index += 1
+
+def print_profile_report(profiles, top=10):
+    """Print the phase timings and counters of the slowest problems"""
+    phases = ['transform', 'compile', 'execute', 'object_table', 'relationships', 'grouping', 'ast_serialization', 'serialize']
+    totals = {problem_id: sum(profile['phases'].values()) for problem_id, profile in profiles.items()}
+    slowest = sorted(profiles, key=lambda problem_id: totals[problem_id], reverse=True)[:top]
+    print(f"\nSlowest {len(slowest)} problems (ms per phase, object_table is included in execute):")
+    print(f"{'Problem':<36} " + " ".join(f"{phase[:10]:>10}" for phase in phases) + f" {'markers':>8} {'objects':>9} {'bytes':>10}")
+    for problem_id in slowest:
+        profile = profiles[problem_id]
+        timings = " ".join(f"{profile['phases'].get(phase, 0) * 1000:>10.1f}" for phase in phases)
+        counters = profile['counters']
+        print(
+            f"{problem_id:<36} {timings} {counters.get('markers_fired', 0):>8} "
+            f"{counters.get('objects_visited', 0):>9} {counters.get('bytes_serialized', 0):>10}"
+        )
+
+def print_isolation_report(report):
+    """Print which problems hit limits, with wall time and peak RSS of every problem"""
+    report = sorted(report, key=lambda entry: entry['id'])
+    print(f"\n{'Problem':<45} {'Status':<14} {'Time (s)':>9} {'Peak RSS (MB)':>14}")
+    for entry in report:
+        peak = f"{entry['peak_rss_mb']:.1f}" if entry['peak_rss_mb'] is not None else "-"
+        print(f"{entry['id']:<45} {entry['status']:<14} {entry['seconds']:>9.2f} {peak:>14}")
+    limited = [entry for entry in report if entry['status'] in ('cpu limit', 'memory limit', 'timeout')]
+    if limited:
+        print(f"{len(limited)} problems hit limits: {', '.join(entry['id'] for entry in limited)}")
+    else:
+        print("No problems hit limits")
+
+# filename -> [(first line, last line, qualified name)] of its functions
+_function_spans = {}
+
+def _function_at(filename, lineno):
+    """Qualified name of the innermost function of a module that contains a line"""
+    spans = _function_spans.get(filename)
+    if spans is None:
+        with open(filename, 'r') as f:
+            tree = ast.parse(f.read())
+        spans = []
+        stack = [(tree, '')]
+        while stack:
+            node, prefix = stack.pop()
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    name = f"{prefix}{child.name}"
+                    if not isinstance(child, ast.ClassDef):
+                        spans.append((child.lineno, child.end_lineno, name))
+                    stack.append((child, f"{name}."))
+                else:
+                    stack.append((child, prefix))
+        _function_spans[filename] = spans
+    containing = [span for span in spans if span[0] <= lineno <= span[1]]
+    return max(containing)[2] if containing else '<module>'
+
+def generate_trace_measured(tracer, problem, compact_ast=False):
+    """Trace a problem under tracemalloc, also returning its peak memory and the live allocations per tracer function"""
+    tracemalloc.start()
+    try:
+        code, trace_data = generate_trace(tracer, problem, compact_ast)
+        peak = tracemalloc.get_traced_memory()[1]
+        # Taken while the steps and the trace data are still alive, which is close to the peak
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(True, os.path.join(TRACER_DIR, module)) for module in TRACER_MODULES]
+    sites = {}
+    for stat in snapshot.filter_traces(filters).statistics('lineno'):
+        frame = stat.traceback[0]
+        site = f"{os.path.basename(frame.filename)}:{_function_at(frame.filename, frame.lineno)}"
+        sites[site] = sites.get(site, 0) + stat.size
+    return code, trace_data, {'peak': peak, 'sites': sites}
+
+def print_memory_report(memory_report, top=10):
+    """Print peak memory per problem and where the tracer modules allocate it"""
+    megabyte = 1024 * 1024
+    largest = sorted(memory_report.items(), key=lambda item: item[1]['peak'], reverse=True)[:top]
+    print(f"\nPeak traced memory of the {len(largest)} largest problems, with their top allocation sites:")
+    for problem_id, memory in largest:
+        print(f"  {problem_id:<40} {memory['peak'] / megabyte:8.1f} MB")
+        sites = sorted(memory['sites'].items(), key=lambda item: item[1], reverse=True)[:3]
+        for site, size in sites:
+            print(f"      {site:<50} {size / megabyte:8.1f} MB")
+
+    totals = {}
+    for memory in memory_report.values():
+        for site, size in memory['sites'].items():
+            totals[site] = totals.get(site, 0) + size
+    print(f"\nTop allocation sites in the tracer modules, summed over {len(memory_report)} problems:")
+    for site, size in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {site:<54} {size / megabyte:8.1f} MB")
+
+def generate_traces(all_problems, compact_ast=False, workers=1, profile=False, memory_report=None, counting=False):
+    """Yield (problem, code, trace_data, error) in problem order, tracing in a process pool when workers > 1.
+
+    When a `memory_report` dict is given, problems are traced in this process under tracemalloc
+    and their peak memory and allocation sites are stored in it by problem id.
+    """
+    if workers <= 1 or memory_report is not None:
+        tracer = PythonTracer(is_server=True, profile=profile, counting=counting)
+        # An earlier tracer in this process may still own the builtins markers
+        tracer._install_marker_functions(replace=True)
+        for problem in all_problems:
+            print(f"Processing {problem['id']}...")
+            try:
+                if memory_report is not None:
+                    code, trace_data, memory_report[problem['id']] = generate_trace_measured(tracer, problem, compact_ast)
+                else:
+                    code, trace_data = generate_trace(tracer, problem, compact_ast)
+                yield problem, code, trace_data, None
+            except Exception as e:
+                yield problem, None, None, str(e)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(profile, counting)) as executor:
+        results = executor.map(_generate_in_worker, all_problems, [compact_ast] * len(all_problems))
+        # map yields in submission order, so output stays deterministic
+        for problem, (code, trace_data, error, log) in zip(all_problems, results):
+            print(f"Processing {problem['id']}...")
+            print(log, end='')
+            yield problem, code, trace_data, error
+
+DATA_DIR = os.path.abspath(os.path.join(TRACER_DIR, "..", "data"))
+OUTPUT_DIR = os.path.join(DATA_DIR, "traces")
+AST_DIR = os.path.join(DATA_DIR, "asts")
+MANIFEST_PATH = os.path.join(DATA_DIR, "trace-manifest.json")
+
+def load_all_problems():
+    """Load every problem and lesson that traces are generated for"""
+    all_problems = []
+    
+    # Load main problems
+    try:
+        with open(os.path.join(DATA_DIR, "problems.json"), "r") as f:
+            problems = json.load(f)['problems']
+            all_problems.extend(problems)
+            print(f"Loaded {len(problems)} problems from problems.json")
+    except FileNotFoundError:
+        print("problems.json not found")
+    
+    # Load lesson problems
+    try:
+        with open(os.path.join(DATA_DIR, "lesson-problems.json"), "r") as f:
+            lesson_problems = json.load(f)
+            all_problems.extend(lesson_problems)
+            print(f"Loaded {len(lesson_problems)} lessons from lesson-problems.json")
+    except FileNotFoundError:
+        print("lesson-problems.json not found")
+    return all_problems
+
+def build_traces(problem_ids=None, compact_ast=False, shared_ast=False, workers=1, profile=False, memory_report=False,
+                 isolate=False, cpu_limit=30, memory_limit=1024, timeout=120, force=False, counting=False):
+    """Generate, validate and write the traces of the given problems, or of all problems when None.
+
+    Traces that the manifest says are up to date are skipped unless `force` is set. Returns a dict
+    with the ids of the problems whose traces were 'built', were 'up_to_date', 'failed' to generate,
+    or were written but are 'invalid'. Raises ValueError for unknown problem ids.
+    """
+    if memory_report and (isolate or workers > 1):
+        raise ValueError("memory_report traces in this process and cannot be combined with isolate or workers")
+
+    # Let's not delete the output directory for now
+    # if os.path.exists(OUTPUT_DIR):
+    #     for file in os.listdir(OUTPUT_DIR):
+    #         os.remove(os.path.join(OUTPUT_DIR, file))
+    
+    # Create output directory if it doesn't exist
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    
+    # Load problems from both files
+    all_problems = load_all_problems()
+    
+    if problem_ids:
+        known_ids = {problem['id'] for problem in all_problems}
+        unknown_ids = [problem_id for problem_id in problem_ids if problem_id not in known_ids]
+        if unknown_ids:
+            raise ValueError(f"Unknown problem ids: {', '.join(unknown_ids)}")
+        all_problems = [problem for problem in all_problems if problem['id'] in problem_ids]
+
+    print(f"Total items to process: {len(all_problems)}")
+    
+    if shared_ast:
+        os.makedirs(AST_DIR, exist_ok=True)
+    shared_asts = set()
+
+    # Skip problems whose inputs and tracer are unchanged since their trace was built
+    manifest = load_manifest(MANIFEST_PATH)
+    version = tracer_version()
+    options = {'compact_ast': compact_ast, 'shared_ast': shared_ast, 'profile': profile, 'counting': counting}
+    hashes = {problem['id']: problem_hash(problem, version, options) for problem in all_problems}
+    stale_problems = []
+    up_to_date_ids = []
+    for problem in all_problems:
+        up_to_date = (
+            not force
+            and manifest.get(problem['id']) == hashes[problem['id']]
+            and os.path.exists(os.path.join(OUTPUT_DIR, f"{problem['id']}.json"))
+        )
+        if up_to_date and shared_ast:
+            # The trace references its AST by key, keep it in the store index
+            code = problem['template'] if 'template' in problem else problem['solution']
+            key = source_hash(code)
+            up_to_date = os.path.exists(os.path.join(AST_DIR, f"{key}.json"))
+            if up_to_date:
+                shared_asts.add(key)
+        if up_to_date:
+            up_to_date_ids.append(problem['id'])
+        else:
+            stale_problems.append(problem)
+    print(f"{len(all_problems) - len(stale_problems)} traces up to date, {len(stale_problems)} to build")
+
+    print(f"Tracing with {workers} worker{'s' if workers > 1 else ''}")
+    errors = []
+    invalid = []
+    built = []
+    profiles = {}
+    memory_reports = {} if memory_report else None
+    written = []
+    isolation_report = []
+    if isolate:
+        results = generate_traces_isolated(
+            stale_problems, compact_ast, workers, cpu_limit, memory_limit, timeout, isolation_report, profile, counting)
+    else:
+        results = generate_traces(stale_problems, compact_ast, workers, profile, memory_reports, counting)
+    for problem, code, trace_data, error in results:
+        if error is not None:
+            print(f"Error tracing {problem['id']}: {error}")
+            errors.append(problem['id'])
+            manifest.pop(problem['id'], None)
+            continue
+        # Validate the AST while it is still in memory instead of reading the file back
+        is_valid, conflicts, _ = validate_tree(trace_data['ast'])
+        if not is_valid:
+            format_conflict_report(conflicts, problem['id'])
+            invalid.append(problem['id'])
+        try:
+            # Move the AST into the shared store, writing it only the first time the source is seen
+            if shared_ast and trace_data['ast']:
+                key = source_hash(code)
+                if key not in shared_asts:
+                    with open(os.path.join(AST_DIR, f"{key}.json"), 'w') as f:
+                        json.dump(trace_data['ast'], f, indent=2)
+                    shared_asts.add(key)
+                trace_data['ast'] = {'ref': key}
+            output_path = os.path.join(OUTPUT_DIR, f"{problem['id']}.json")
+            if profile:
+                # Measure serialization, then serialize again so the artifact carries the numbers
+                problem_profile = trace_data['metadata']['profile']
+                start = time.perf_counter()
+                serialized = json.dumps(trace_data, indent=2)
+                problem_profile['phases']['serialize'] = round(time.perf_counter() - start, 6)
+                problem_profile['counters']['bytes_serialized'] = len(serialized.encode('utf-8'))
+                profiles[problem['id']] = problem_profile
+            with open(output_path, 'w') as f:
+                json.dump(trace_data, f, indent=2)
+            written.append(output_path)
+            built.append(problem['id'])
+            # Invalid traces are written for inspection but rebuilt on the next run
+            if is_valid:
+                manifest[problem['id']] = hashes[problem['id']]
+            else:
+                manifest.pop(problem['id'], None)
+        except Exception as e:
+            print(f"Error saving results for {problem['id']}: {e}")
+            errors.append(problem['id'])
+            manifest.pop(problem['id'], None)
+            continue
+    
+    write_manifest(MANIFEST_PATH, manifest)
+    
+    if shared_ast:
+        if problem_ids:
+            # A selective build only sees some of the keys, keep the rest of the store indexed
+            shared_asts.update(os.path.splitext(name)[0] for name in os.listdir(AST_DIR) if name.endswith('.json'))
+        write_shared_asts_ts(AST_DIR, shared_asts)
+        print(f"Stored {len(shared_asts)} distinct ASTs in {AST_DIR}")
+    if profile:
+        print_profile_report(profiles)
+    if memory_report:
+        print_memory_report(memory_reports)
+    if isolate:
+        print_isolation_report(isolation_report)
+    if errors:
+        print(f"Failed to generate {len(errors)} traces: {', '.join(errors)}")
+    print("Done generating traces!")
+    
+    # Every written trace was validated before it was saved, skipped traces when they were built
+    print(f"\n{'='*60}")
+    print(f"🔍 Validated {len(written)} rebuilt traces, {len(invalid)} with conflicts")
+    if invalid:
+        print(f"Invalid traces: {', '.join(invalid)}")
+    if errors:
+        print("❌ SOME TRACES FAILED TO GENERATE - CHECK OUTPUT ABOVE")
+    elif invalid:
+        print("❌ SOME TRACES FAILED VALIDATION - CHECK OUTPUT ABOVE")
+    else:
+        print("🎉 ALL TRACES GENERATED SUCCESSFULLY AND PASSED VALIDATION!")
+    print('='*60)
+
+    return {'built': built, 'up_to_date': up_to_date_ids, 'failed': errors, 'invalid': invalid}
@@ -0,0 +1,219 @@
+"""
+Compact binary encoding of trace data for handing traces to JavaScript without JSON.
+
+The encoding is a single pass over the same values json.dumps accepts. Every value starts with
+a one byte tag. Strings (including map keys) are stored once and referenced by index when they
+repeat, which removes most of a trace's size since steps repeat the same keys, events and focus
+snippets. Lengths, string indexes and integers are LEB128 varints, integers zigzag encoded.
+
+The decoder lives in src/utils/traceCodec.ts and reads the bytes in place, so the buffer can be
+shared with JavaScript as a memoryview instead of being copied as a string.
+"""
+
+import struct
+
+MAGIC = b'DCT1'
+
+NULL = 0
+FALSE = 1
+TRUE = 2
+INT = 3  # zigzag varint
+FLOAT = 4  # little-endian float64
+STRING = 5  # varint byte length and UTF-8 bytes, added to the string table
+STRING_REF = 6  # varint index into the string table
+ARRAY = 7  # varint length and items
+MAP = 8  # varint length and (key string, value) pairs
+
+# JavaScript numbers hold integers exactly up to 2**53. Zigzag encoding doubles the magnitude, so only
+# integers up to 2**52 keep their varint exact in the decoder, larger ones are sent as floats like
+# JSON.parse would read them
+MAX_INT_MAGNITUDE = 2 ** 52
+
+_pack_float = struct.Struct('<d').pack
+
+
+def _map_key(key):
+    """Convert a dict key to the string json.dumps would use"""
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, int):
+        return int.__repr__(key)
+    if isinstance(key, float):
+        return float.__repr__(key)
+    raise TypeError(f'keys must be str, int, float, bool or None, not {type(key).__name__}')
+
+
+def encode_trace(data):
+    """Encode JSON-compatible data, such as the result of get_trace_data, as a bytearray.
+
+    The buffer is returned as built, copying it into bytes would briefly hold the trace twice.
+    """
+    out = bytearray(MAGIC)
+    append = out.append
+    strings = {}
+
+    def write_varint(n):
+        while n > 0x7f:
+            append((n & 0x7f) | 0x80)
+            n >>= 7
+        append(n)
+
+    def write_string(s):
+        index = strings.get(s)
+        if index is not None:
+            append(STRING_REF)
+            write_varint(index)
+            return
+        strings[s] = len(strings)
+        raw = s.encode('utf-8')
+        append(STRING)
+        write_varint(len(raw))
+        out.extend(raw)
+
+    def write(value):
+        kind = type(value)
+        if kind is str:
+            write_string(value)
+        elif kind is dict:
+            append(MAP)
+            write_varint(len(value))
+            for key, item in value.items():
+                write_string(key if type(key) is str else _map_key(key))
+                write(item)
+        elif kind is list or kind is tuple:
+            append(ARRAY)
+            write_varint(len(value))
+            for item in value:
+                write(item)
+        elif value is None:
+            append(NULL)
+        elif value is True:
+            append(TRUE)
+        elif value is False:
+            append(FALSE)
+        elif kind is int:
+            if -MAX_INT_MAGNITUDE <= value <= MAX_INT_MAGNITUDE:
+                append(INT)
+                write_varint(value * 2 if value >= 0 else -value * 2 - 1)
+            else:
+                append(FLOAT)
+                out.extend(_pack_float(float(value)))
+        elif kind is float:
+            append(FLOAT)
+            out.extend(_pack_float(value))
+        # Subclasses, such as IntEnum members, are encoded like their base type as json.dumps does
+        elif isinstance(value, str):
+            write_string(str(value))
+        elif isinstance(value, int):
+            write(int(value))
+        elif isinstance(value, float):
+            write(float(value))
+        elif isinstance(value, dict):
+            write(dict(value))
+        elif isinstance(value, (list, tuple)):
+            write(list(value))
+        else:
+            raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+    write(data)
+    return out
+
+
+def decode_trace(buffer):
+    """Decode a buffer produced by encode_trace, mirroring the JavaScript decoder"""
+    view = memoryview(buffer)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Not an encoded trace')
+    pos = len(MAGIC)
+    strings = []
+
+    def read_varint():
+        nonlocal pos
+        result = 0
+        shift = 0
+        while True:
+            byte = view[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def read_string(tag):
+        nonlocal pos
+        if tag == STRING_REF:
+            return strings[read_varint()]
+        if tag != STRING:
+            raise ValueError(f'Expected a string at byte {pos - 1}')
+        length = read_varint()
+        value = str(view[pos:pos + length], 'utf-8')
+        pos += length
+        strings.append(value)
+        return value
+
+    def read():
+        nonlocal pos
+        tag = view[pos]
+        pos += 1
+        if tag == MAP:
+            result = {}
+            for _ in range(read_varint()):
+                key_tag = view[pos]
+                pos += 1
+                key = read_string(key_tag)
+                result[key] = read()
+            return result
+        if tag == ARRAY:
+            return [read() for _ in range(read_varint())]
+        if tag == STRING or tag == STRING_REF:
+            return read_string(tag)
+        if tag == INT:
+            n = read_varint()
+            return n >> 1 if n & 1 == 0 else -((n + 1) >> 1)
+        if tag == FLOAT:
+            value = struct.unpack_from('<d', view, pos)[0]
+            pos += 8
+            return value
+        if tag == NULL:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        raise ValueError(f'Unknown tag {tag} at byte {pos - 1}')
+
+    return read()
+
+
+def _decode_int_like_javascript(buffer):
+    """Decode an encoded integer with float arithmetic only, as the JavaScript decoder does"""
+    if buffer[len(MAGIC)] != INT:
+        return decode_trace(buffer)
+    result, scale = 0.0, 1.0
+    for byte in buffer[len(MAGIC) + 1:]:
+        result += (byte & 0x7f) * scale
+        scale *= 128
+    return result / 2 if result % 2 == 0 else -(result + 1) / 2
+
+
+if __name__ == '__main__':
+    # Round trip integers around the limits of the INT tag and of exact JavaScript numbers
+    boundaries = [0, 1, -1, 2 ** 52 - 1, 2 ** 52, 2 ** 52 + 3, 2 ** 53 - 1, 2 ** 53, 2 ** 64]
+    for value in boundaries + [-value for value in boundaries]:
+        encoded = encode_trace(value)
+        assert isinstance(encoded, bytearray)
+        assert decode_trace(encoded) == value, value
+        assert decode_trace(memoryview(encoded)) == value, value
+        assert _decode_int_like_javascript(encoded) == value, value
+    data = {'trace': [{'id': 1, 'value': -(2 ** 52 + 3)}, None, True, 1.5, 'step', 'step'], 2: 'key'}
+    assert decode_trace(encode_trace(data)) == {'trace': data['trace'], '2': 'key'}
+    # A traced dict may use any key, the JavaScript decoder must not treat this one as the prototype
+    data = {'locals': {'__proto__': {'x': 1}, 'constructor': 2}}
+    assert decode_trace(encode_trace(data)) == data
+    print('trace_codec round trips passed')
@@ -0,0 +1,75 @@
+"""
+Entry point for tracing from the browser.
+
+Pyodide loads the tracer modules once and then calls trace_code_encoded for every run, passing the
+user code and inputs as arguments instead of pasting them into generated Python source.
+The tracer is created on the first call and kept warm, so its transformer and relationship
+caches carry over between runs.
+"""
+
+import re
+import ast
+import json
+
+from python_tracer import PythonTracer
+from trace_codec import encode_trace
+
+_tracer = None
+
+def get_tracer():
+    """The warm tracer shared by every call, created on first use"""
+    global _tracer
+    if _tracer is None:
+        _tracer = PythonTracer(incremental=True)
+    return _tracer
+
+def defines_function(code, name):
+    """Whether the code defines a function with this name at any level"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # The tracer reports the syntax error itself, fall back to matching the source
+        return re.search(rf'^[ \t]*(async[ \t]+)?def[ \t]+{re.escape(name)}[ \t]*\(', code, re.MULTILINE) is not None
+    return any(
+        isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name
+        for node in ast.walk(tree)
+    )
+
+def run_trace(code, entrypoint=None, inputs=None, special_inputs=None, manual_relationships=None, stream=None):
+    """Trace code, calling entrypoint with inputs as keyword arguments, and return the trace data.
+
+    If the code does not define the entrypoint, it is expected to call its function itself. Errors
+    are returned as {"error": message} so that the caller always gets a trace-shaped result.
+    With a `stream` callback, the trace is also sent to it in parts while the code runs.
+    """
+    tracer = get_tracer()
+    tracer.stream = stream
+    try:
+        tracer.reset()
+        # Another tracer may have taken over the builtins markers since the last call
+        tracer._install_marker_functions(replace=True)
+        if entrypoint and not defines_function(code, entrypoint):
+            entrypoint = None
+        transformed_ast = tracer.run_code(
+            code,
+            entrypoint,
+            special_inputs,
+            manual_relationships,
+            **(inputs or {})
+        )
+        return tracer.get_trace_data(transformed_ast)
+    except Exception as e:
+        return {"error": f"Python execution failed: {str(e)}"}
+    finally:
+        tracer.stream = None
+
+def trace_code(code, entrypoint=None, inputs=None, special_inputs=None, manual_relationships=None):
+    """Trace code like run_trace and return the trace as JSON"""
+    return json.dumps(run_trace(code, entrypoint, inputs, special_inputs, manual_relationships))
+
+def trace_code_encoded(code, entrypoint=None, inputs=None, special_inputs=None, manual_relationships=None):
+    """Trace code like run_trace and return the trace in the compact binary encoding of trace_codec.
+
+    The buffer can be read from JavaScript through a view without copying it into a string.
+    """
+    return encode_trace(run_trace(code, entrypoint, inputs, special_inputs, manual_relationships))
@@ -1,10 +1,10 @@
-import copy
-
 """
 Utility functions for the Python tracer that don't depend on class state.
 These are pure functions that can be used across different modules.
 """
 
+import copy
+
 # Helper to detect mutability for pointer-aware tracing
 
 def is_collection(obj):
@@ -6,6 +6,8 @@ Run this after generating trace files to ensure data integrity.
 Usage:
     python3 validate_trace.py <trace_file.json>
     python3 validate_trace.py public/traces/  # Validate all files in directory
+    python3 validate_trace.py public/traces/ --workers 0  # Validate files in parallel on every core
+    python3 validate_trace.py public/traces/ --stream  # Bounded memory, also checks node_id and object references
     
 Or use validate_tree(ast_root) to validate an AST object directly.
 """
@@ -13,17 +15,24 @@ Or use validate_tree(ast_root) to validate an AST object directly.
 import json
 import sys
 import os
+import io
 import glob
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import ast
 
-def collect_ast_node_info(obj, node_info=None):
+from json_stream import iter_events
+
+def collect_ast_node_info(obj, node_info=None, transformer=None):
     """
     Recursively collect AST nodes with their IDs and types from JSON data
     
     Args:
         obj: JSON object to traverse (should be the AST section)
         node_info: Dict mapping node_id -> list of (type, context) tuples
+        transformer: ASTTransformer that assigned the node IDs (needed for AST objects)
         
     Returns:
         Dict mapping node_id -> list of (type, context) tuples
@@ -31,8 +40,13 @@ def collect_ast_node_info(obj, node_info=None):
     if node_info is None:
         node_info = {}
     
+    # Validate compact JSON (flat arrays indexed by node ID, see ASTTransformer.ast_to_compact)
+    if isinstance(obj, dict) and obj.get('format') == 'compact':
+        for node_id, type_index in enumerate(obj['node_types']):
+            if type_index != -1:
+                node_info.setdefault(node_id, []).append(obj['types'][type_index])
     # Validate JSON
-    if isinstance(obj, dict):
+    elif isinstance(obj, dict):
         # Check if this is an AST node with node_id and type
         if 'node_id' in obj and 'type' in obj:
             node_id = obj['node_id']
@@ -44,14 +58,14 @@ def collect_ast_node_info(obj, node_info=None):
         
         # Recursively process all values
         for value in obj.values():
-            collect_ast_node_info(value, node_info)
+            collect_ast_node_info(value, node_info, transformer)
     elif isinstance(obj, list):
         # Recursively process all items
         for item in obj:
-            collect_ast_node_info(item, node_info)
+            collect_ast_node_info(item, node_info, transformer)
     # Validate AST
     elif isinstance(obj, ast.AST):
-        node_id = getattr(obj, "_tracer_id", None)
+        node_id = transformer.get_node_id(obj) if transformer else None
         # get the name of the node
         node_type = type(obj).__name__
         # node_id is None for marker nodes
@@ -61,22 +75,23 @@ def collect_ast_node_info(obj, node_info=None):
             node_info[node_id].append(node_type)
         # iterate through children to collect info
         for child in ast.iter_child_nodes(obj):
-            collect_ast_node_info(child, node_info)
+            collect_ast_node_info(child, node_info, transformer)
     return node_info
 
 
-def validate_tree(ast_root):
+def validate_tree(ast_root, transformer=None):
     """
     Validate an AST tree object directly for node ID consistency
     
     Args:
         ast_root: The AST root object (from ast_transformer or converted to dict)
+        transformer: ASTTransformer that assigned the node IDs, when ast_root is an AST object
         
     Returns:
         Tuple of (is_valid, conflicts, total_ast_nodes)
     """
     # Collect AST node information from the AST root
-    node_info = collect_ast_node_info(ast_root)
+    node_info = collect_ast_node_info(ast_root, transformer=transformer)
     
     # Check for conflicts
     conflicts = []
@@ -93,12 +108,13 @@ def validate_tree(ast_root):
     return len(conflicts) == 0, conflicts, len(node_info)
 
 
-def validate_trace_file(filepath):
+def validate_trace_file(filepath, ast_dir=None):
     """
     Validate a single trace file for AST node ID consistency
     
     Args:
         filepath: Path to the trace JSON file
+        ast_dir: Shared AST store for traces that reference their AST (defaults to the 'asts' directory next to the traces)
         
     Returns:
         Tuple of (is_valid, conflicts, total_ast_nodes)
@@ -115,8 +131,206 @@ def validate_trace_file(filepath):
         print(f"❌ No 'ast' section found in {filepath}")
         return False, [], 0
     
+    # Resolve ASTs kept in the shared store
+    ast_root = trace_data['ast']
+    if isinstance(ast_root, dict) and 'ref' in ast_root:
+        if ast_dir is None:
+            ast_dir = os.path.join(os.path.dirname(os.path.abspath(filepath)), '..', 'asts')
+        ast_path = os.path.join(ast_dir, f"{ast_root['ref']}.json")
+        try:
+            with open(ast_path, 'r') as f:
+                ast_root = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"❌ Error reading shared AST {ast_path}: {e}")
+            return False, [], 0
+    
     # Use the validate_tree function on the AST section
-    return validate_tree(trace_data['ast'])
+    return validate_tree(ast_root)
+
+
+class _StreamingAstCollector:
+    """Collect node ID -> type from the events of an AST, nested or compact, without building it"""
+    
+    def __init__(self, base):
+        self.base = base  # Prefix of the AST root
+        self.node_types = {}
+        self.conflicts = {}
+        self.maps = []  # (prefix, [node_id, type]) for every open map
+        self.compact = False
+        self.compact_types = []
+        self.compact_node_types = []
+        self.ref = None
+        
+    def _record(self, node_id, node_type):
+        known = self.node_types.setdefault(node_id, node_type)
+        if known != node_type:
+            self.conflicts.setdefault(node_id, {known}).add(node_type)
+            
+    def feed(self, prefix, event, value):
+        """Consume one event whose prefix lies inside the AST"""
+        if event == 'start_map':
+            self.maps.append((prefix, [None, None]))
+        elif event == 'end_map':
+            _, (node_id, node_type) = self.maps.pop()
+            if node_id is not None and node_type is not None:
+                self._record(node_id, node_type)
+        elif event == 'value':
+            parent, _, key = prefix.rpartition('.')
+            if parent == self.base:
+                if key == 'format' and value == 'compact':
+                    self.compact = True
+                elif key == 'ref':
+                    self.ref = value
+            if self.maps and self.maps[-1][0] == parent:
+                if key == 'node_id':
+                    self.maps[-1][1][0] = value
+                elif key == 'type':
+                    self.maps[-1][1][1] = value
+            if parent == self._join('types'):
+                self.compact_types.append(value)
+            elif parent == self._join('node_types'):
+                self.compact_node_types.append(value)
+                
+    def _join(self, key):
+        return f"{self.base}.{key}" if self.base else key
+        
+    def finish(self):
+        """Return (node_types, conflicts) once the AST has been consumed"""
+        if self.compact:
+            # Compact ASTs are validated the same way as validate_tree does
+            for node_id, type_index in enumerate(self.compact_node_types):
+                if type_index != -1:
+                    self._record(node_id, self.compact_types[type_index])
+        conflicts = [
+            {'node_id': node_id, 'types': sorted(types)}
+            for node_id, types in self.conflicts.items()
+        ]
+        return self.node_types, conflicts
+
+
+def _stream_ast(path):
+    """Collect node types from a shared AST file"""
+    collector = _StreamingAstCollector('')
+    with open(path, 'r') as f:
+        for prefix, event, value in iter_events(f):
+            collector.feed(prefix, event, value)
+    return collector.finish()
+
+
+def stream_validate_trace_file(filepath, ast_dir=None, max_errors=20):
+    """
+    Validate a trace file while parsing it as a stream, holding at most one trace entry at a time
+    
+    Besides AST node ID consistency, checks that:
+        * every step and relationship node_id exists in the AST
+        * every id in a var_table has an entry in the matching object_table
+    
+    Args:
+        filepath: Path to the trace JSON file
+        ast_dir: Shared AST store for traces that reference their AST (defaults to the 'asts' directory next to the traces)
+        max_errors: Number of reference errors to keep for the report, the rest are only counted
+        
+    Returns:
+        Tuple of (is_valid, conflicts, total_ast_nodes, reference_errors, total_reference_errors)
+    """
+    collector = _StreamingAstCollector('ast')
+    has_ast = False
+    referenced = set()  # node_ids used by steps and relationships
+    errors = []
+    error_count = 0
+    entry = None
+    step = None
+    entry_index = -1
+    
+    def report(message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < max_errors:
+            errors.append(message)
+            
+    def check_tables(where, var_table, object_ids):
+        for name, obj_id in var_table:
+            if str(obj_id) not in object_ids:
+                report(f"{where}: variable '{name}' refers to {obj_id}, which is missing from the object_table")
+    
+    try:
+        with open(filepath, 'r') as f:
+            for prefix, event, value in iter_events(f):
+                if prefix == 'ast' or prefix.startswith('ast.'):
+                    has_ast = True
+                    collector.feed(prefix, event, value)
+                    continue
+                    
+                if prefix == 'trace.item':
+                    if event == 'start_map':
+                        entry_index += 1
+                        entry = {'objects': set(), 'vars': [], 'steps': []}
+                    elif event == 'end_map':
+                        where = f"trace[{entry_index}]"
+                        check_tables(where, entry['vars'], entry['objects'])
+                        for step_number, step_vars, step_objects in entry['steps']:
+                            # Steps only keep the tables that differ from their entry's
+                            check_tables(
+                                f"{where} step {step_number}",
+                                entry['vars'] if step_vars is None else step_vars,
+                                entry['objects'] if step_objects is None else step_objects,
+                            )
+                        entry = None
+                elif prefix == 'trace.item.object_table':
+                    if event == 'map_key':
+                        entry['objects'].add(value)
+                elif prefix.startswith('trace.item.var_table.'):
+                    entry['vars'].append((prefix[len('trace.item.var_table.'):], value))
+                elif prefix == 'trace.item.steps.item':
+                    if event == 'start_map':
+                        step = {'step': None, 'vars': None, 'objects': None}
+                    elif event == 'end_map':
+                        if step['vars'] is not None or step['objects'] is not None:
+                            entry['steps'].append((step['step'], step['vars'], step['objects']))
+                        step = None
+                elif prefix == 'trace.item.steps.item.step':
+                    step['step'] = value
+                elif prefix == 'trace.item.steps.item.node_id':
+                    referenced.add(value)
+                elif prefix == 'trace.item.steps.item.object_table':
+                    if event == 'start_map':
+                        step['objects'] = set()
+                    elif event == 'map_key':
+                        step['objects'].add(value)
+                elif prefix == 'trace.item.steps.item.var_table':
+                    if event == 'start_map':
+                        step['vars'] = []
+                elif prefix.startswith('trace.item.steps.item.var_table.'):
+                    step['vars'].append((prefix[len('trace.item.steps.item.var_table.'):], value))
+                elif prefix == 'relationships.item.node_id':
+                    # Manual relationships use negative placeholder IDs
+                    if value >= 0:
+                        referenced.add(value)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"❌ Error reading {filepath}: {e}")
+        return False, [], 0, [], 0
+    
+    if not has_ast:
+        print(f"❌ No 'ast' section found in {filepath}")
+        return False, [], 0, [], 0
+    
+    node_types, conflicts = collector.finish()
+    # Resolve ASTs kept in the shared store
+    if collector.ref is not None:
+        if ast_dir is None:
+            ast_dir = os.path.join(os.path.dirname(os.path.abspath(filepath)), '..', 'asts')
+        ast_path = os.path.join(ast_dir, f"{collector.ref}.json")
+        try:
+            node_types, conflicts = _stream_ast(ast_path)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"❌ Error reading shared AST {ast_path}: {e}")
+            return False, [], 0, [], 0
+    
+    for node_id in sorted(referenced - node_types.keys()):
+        report(f"node_id {node_id} is referenced by the trace but missing from the AST")
+    
+    is_valid = not conflicts and error_count == 0
+    return is_valid, conflicts, len(node_types), errors, error_count
 
 
 def format_conflict_report(conflicts, filepath=None):
@@ -138,10 +352,24 @@ def format_conflict_report(conflicts, filepath=None):
                 print(f"      ... and {len(types) - 3} more")
 
 
-def validate_single_file(filepath):
-    """Validate a single trace file"""
+def validate_single_file(filepath, stream=False):
+    """Validate a single trace file, optionally with the streaming validator"""
     print(f"🔍 Validating: {filepath}")
     
+    if stream:
+        is_valid, conflicts, total_nodes, reference_errors, total_reference_errors = stream_validate_trace_file(filepath)
+        if reference_errors:
+            print(f"\n🚨 Found {total_reference_errors} broken references:")
+            for message in reference_errors:
+                print(f"  • {message}")
+            if total_reference_errors > len(reference_errors):
+                print(f"  ... and {total_reference_errors - len(reference_errors)} more")
+        if conflicts:
+            format_conflict_report(conflicts, filepath)
+        if is_valid:
+            print(f"✅ VALID - {total_nodes} unique AST node IDs, no conflicts or broken references")
+        return is_valid
+    
     is_valid, conflicts, total_nodes = validate_trace_file(filepath)
     
     if is_valid:
@@ -152,9 +380,17 @@ def validate_single_file(filepath):
         return False
 
 
-def validate_directory(directory):
-    """Validate all JSON files in a directory"""
-    json_files = glob.glob(os.path.join(directory, "*.json"))
+def _validate_file_logged(filepath, stream=False):
+    """Validate a single trace file in a worker, returning its output instead of interleaving prints"""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        is_valid = validate_single_file(filepath, stream)
+    return is_valid, log.getvalue()
+
+
+def validate_directory(directory, workers=1, stream=False):
+    """Validate all JSON files in a directory, in a process pool when workers > 1"""
+    json_files = sorted(glob.glob(os.path.join(directory, "*.json")))
     
     if not json_files:
         print(f"❌ No JSON files found in {directory}")
@@ -165,17 +401,34 @@ def validate_directory(directory):
     all_valid = True
     valid_count = 0
     
-    for filepath in sorted(json_files):
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_validate_file_logged, json_files, [stream] * len(json_files), chunksize=8)
+    else:
+        executor = None
+        results = (None for _ in json_files)
+    
+    # Results arrive in file order, so the report reads the same either way
+    for filepath, result in zip(json_files, results):
         filename = os.path.basename(filepath)
         print(f"\n{'='*50}")
         print(f"Validating: {filename}")
         print('='*50)
         
-        if validate_single_file(filepath):
+        if result is None:
+            is_valid = validate_single_file(filepath, stream)
+        else:
+            is_valid, log = result
+            print(log, end='')
+        
+        if is_valid:
             valid_count += 1
         else:
             all_valid = False
     
+    if executor is not None:
+        executor.shutdown()
+    
     # Summary
     print(f"\n{'='*50}")
     print("VALIDATION SUMMARY")
@@ -194,13 +447,14 @@ def validate_directory(directory):
 
 def main():
     """Main validation function"""
-    if len(sys.argv) != 2:
-        print("Usage:")
-        print("  python3 validate_trace.py <trace_file.json>")
-        print("  python3 validate_trace.py <directory>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Check that all AST nodes with the same ID have the same type.')
+    parser.add_argument('path', help='Trace file or directory of trace files')
+    parser.add_argument('--workers', type=int, default=1, help='Validate a directory in this many processes, 0 uses every available core')
+    parser.add_argument('--stream', action='store_true', help='Parse files incrementally with bounded memory and also check node_id and object table references')
+    args = parser.parse_args()
     
-    path = sys.argv[1]
+    path = args.path
+    workers = args.workers or os.cpu_count() or 1
     
     if not os.path.exists(path):
         print(f"❌ Path does not exist: {path}")
@@ -212,10 +466,10 @@ def main():
     
     if os.path.isfile(path):
         # Validate single file
-        success = validate_single_file(path)
+        success = validate_single_file(path, args.stream)
     elif os.path.isdir(path):
         # Validate directory
-        success = validate_directory(path)
+        success = validate_directory(path, workers, args.stream)
     else:
         print(f"❌ Invalid path: {path}")
         sys.exit(1)
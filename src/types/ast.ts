@@ -14,6 +14,21 @@ export interface AST {
   [key: string]: any; // Allow additional fields
 }
 
+// Compact encoding of a whole tree: flat arrays indexed by node_id
+export interface CompactAST {
+  format: "compact";
+  types: string[]; // Distinct type names
+  node_types: number[]; // Index into types, -1 for unused node IDs
+  parents: number[]; // Parent node_id, -1 for the root and unused node IDs
+  locations: (number | null)[]; // lineno, col_offset, end_lineno, end_col_offset per node
+  fields: Record<string, Record<string, any>>; // Scalar fields (names, values, ...) by node_id
+}
+
+// Reference to an AST kept once in the shared store, keyed by source hash
+export interface SharedASTRef {
+  ref: string;
+}
+
 // Base statement type
 export interface stmt extends AST {
   type:
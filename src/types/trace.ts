@@ -1,4 +1,4 @@
-import type { AST } from "./ast";
+import type { AST, CompactAST, SharedASTRef } from "./ast";
 
 // Relationship types for container-cursor analysis
 export type RelationshipType =
@@ -78,9 +78,19 @@ export type TraceData = {
     };
     stdout: string;
     finalLocals: Record<string, any>;
+    // Present when generated with trace.py --profile
+    profile?: {
+      phases: Record<string, number>; // Seconds per phase
+      counters: Record<string, number>;
+    };
   };
-  ast: AST;
+  ast: AST | CompactAST | SharedASTRef;
   relationships: Relationship[];
   trace: TraceLine[];
+  // Present instead of steps when traced in counting mode
+  execution_counts?: {
+    nodes: number[]; // Executions per node_id
+    lines: Record<string, number>; // Executions per line number
+  };
   result: any;
 };
@@ -0,0 +1,112 @@
+// Decoder for the binary trace encoding written by src/tracer/trace_codec.py.
+// Reads the bytes in place, so a trace can be decoded straight from a view of
+// the Python buffer instead of being copied into a JSON string first.
+
+const MAGIC = "DCT1";
+
+const NULL = 0;
+const FALSE = 1;
+const TRUE = 2;
+const INT = 3;
+const FLOAT = 4;
+const STRING = 5;
+const STRING_REF = 6;
+const ARRAY = 7;
+const MAP = 8;
+
+export function isEncodedTrace(bytes: Uint8Array): boolean {
+  return (
+    bytes.length >= MAGIC.length &&
+    String.fromCharCode(...bytes.subarray(0, MAGIC.length)) === MAGIC
+  );
+}
+
+export function decodeTrace(bytes: Uint8Array): any {
+  if (!isEncodedTrace(bytes)) {
+    throw new Error("Not an encoded trace");
+  }
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const textDecoder = new TextDecoder();
+  const strings: string[] = [];
+  let pos = MAGIC.length;
+
+  // Varints can exceed 32 bits, so avoid bitwise operators
+  const readVarint = (): number => {
+    let result = 0;
+    let scale = 1;
+    while (true) {
+      const byte = bytes[pos++]!;
+      result += (byte & 0x7f) * scale;
+      if (byte < 0x80) return result;
+      scale *= 128;
+    }
+  };
+
+  const readString = (tag: number): string => {
+    if (tag === STRING_REF) return strings[readVarint()]!;
+    if (tag !== STRING) {
+      throw new Error(`Expected a string at byte ${pos - 1}`);
+    }
+    const length = readVarint();
+    const value = textDecoder.decode(bytes.subarray(pos, pos + length));
+    pos += length;
+    strings.push(value);
+    return value;
+  };
+
+  const read = (): any => {
+    const tag = bytes[pos++]!;
+    switch (tag) {
+      case MAP: {
+        const result: Record<string, any> = {};
+        const length = readVarint();
+        for (let i = 0; i < length; i++) {
+          const key = readString(bytes[pos++]!);
+          const value = read();
+          if (key === "__proto__") {
+            // Assigning would call the prototype setter, JSON.parse creates an own property
+            Object.defineProperty(result, key, {
+              value,
+              enumerable: true,
+              writable: true,
+              configurable: true,
+            });
+          } else {
+            result[key] = value;
+          }
+        }
+        return result;
+      }
+      case ARRAY: {
+        const length = readVarint();
+        const result = new Array(length);
+        for (let i = 0; i < length; i++) {
+          result[i] = read();
+        }
+        return result;
+      }
+      case STRING:
+      case STRING_REF:
+        return readString(tag);
+      case INT: {
+        const n = readVarint();
+        return n % 2 === 0 ? n / 2 : -(n + 1) / 2;
+      }
+      case FLOAT: {
+        const value = view.getFloat64(pos, true);
+        pos += 8;
+        return value;
+      }
+      case NULL:
+        return null;
+      case TRUE:
+        return true;
+      case FALSE:
+        return false;
+      default:
+        throw new Error(`Unknown tag ${tag} at byte ${pos - 1}`);
+    }
+  };
+
+  return read();
+}